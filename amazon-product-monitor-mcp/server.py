@@ -5,14 +5,24 @@
 """
 
 import asyncio
-import json
+import hashlib
+import inspect
 import logging
-from datetime import datetime
-from typing import Dict, Any, List, Optional
-from pathlib import Path
-
+import threading
+from datetime import datetime, timezone
+from functools import cache
+from typing import Dict, Any, List, Optional, Tuple, Union
+from string import Template
+
+from cachetools import TTLCache
+from diskcache import Cache
 from fastmcp import FastMCP
-from src.amazon_monitor.tools import ProductMonitor, AmazonScraper, ProductAnalyzer, EmailReporter, add_affiliate_id_to_url
+from pydantic import validate_call
+from src.amazon_monitor.tools import (
+    ProductMonitor, AmazonScraper, ProductAnalyzer, EmailReporter, ProductInfo,
+    add_affiliate_id_to_url, json_loads as _loads, json_dumps as _dumps,
+    json_dumps_bytes as _dumps_bytes, CACHE_DIR
+)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -21,15 +31,94 @@ logger = logging.getLogger(__name__)
 # 创建 MCP 服务器实例
 mcp = FastMCP("Amazon Product Monitor")
 
-# 全局实例
-product_monitor = ProductMonitor()
-amazon_scraper = AmazonScraper()
-product_analyzer = ProductAnalyzer()
-email_reporter = EmailReporter()
+
+# 全局实例，首次使用时才创建
+@cache
+def _monitor() -> ProductMonitor:
+    return ProductMonitor()
+
+
+@cache
+def _scraper() -> AmazonScraper:
+    return AmazonScraper()
+
+
+@cache
+def _analyzer() -> ProductAnalyzer:
+    return ProductAnalyzer()
+
+
+@cache
+def _reporter() -> EmailReporter:
+    return EmailReporter()
+
+
+@cache
+def _analysis_disk_cache() -> Cache:
+    """完整分析结果的磁盘缓存，按小时分桶，1 小时过期；跨进程重启保留"""
+    return Cache(str(CACHE_DIR / 'analysis'))
+
+
+# 搜索结果缓存，键为 (关键词, 类别, 页数)，15 分钟过期；
+# 结果字典以 JSON 字节串保存，每次命中都解码出独立的副本，调用方之间互不影响
+_search_cache = TTLCache(maxsize=256, ttl=900)
+_search_cache_lock = threading.Lock()
+
+# analyze_products 的结果缓存，键为输入 JSON 字符串的摘要，同样 15 分钟过期并保存为字节串
+_analysis_result_cache = TTLCache(maxsize=64, ttl=900)
+_analysis_result_cache_lock = threading.Lock()
+
+
+def _now() -> str:
+    """当前时间的 ISO 格式字符串"""
+    return datetime.now().isoformat()
+
+
+def _search_amazon_products_internal(keyword: str, category: str = "All", max_pages: int = 2, *,
+                                     completed_at: Optional[str] = None
+                                     ) -> Tuple[Dict[str, Any], List[ProductInfo]]:
+    """搜索 Amazon 商品，同时返回结果字典和原始 ProductInfo 列表
+
+    供进程内调用方直接复用 ProductInfo 对象，避免再从字典重建。
+    相同参数的搜索在缓存有效期内直接返回缓存结果。
+    completed_at 为 None 时取当前时间作为搜索时间。
+    """
+    # 限制页数范围
+    max_pages = max(1, min(max_pages, 5))
+    
+    cache_key = (keyword.lower().strip(), category, max_pages)
+    with _search_cache_lock:
+        cached = _search_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"命中搜索缓存: {keyword}")
+        result_bytes, cached_products = cached
+        return _loads(result_bytes), list(cached_products)
+    
+    # 搜索商品
+    products = _scraper().search_products(keyword, category, max_pages)
+    
+    # 转换为字典格式
+    product_list = [product.to_dict() for product in products]
+    
+    result = {
+        'keyword': keyword,
+        'category': category,
+        'pages_searched': max_pages,
+        'total_products': len(product_list),
+        'products': product_list,
+        'search_time': completed_at or _now()
+    }
+    
+    # 只缓存有结果的搜索，避免缓存临时失败
+    if products:
+        with _search_cache_lock:
+            _search_cache[cache_key] = (_dumps_bytes(result), tuple(products))
+    
+    return result, products
 
 
 @mcp.tool
-def search_amazon_products(keyword: str, category: str = "All", max_pages: int = 2) -> Dict[str, Any]:
+async def search_amazon_products(keyword: str, category: str = "All", max_pages: int = 2) -> Dict[str, Any]:
     """搜索 Amazon 商品
     
     Args:
@@ -43,25 +132,12 @@ def search_amazon_products(keyword: str, category: str = "All", max_pages: int =
     try:
         logger.info(f"开始搜索 Amazon 商品: {keyword}, 类别: {category}")
         
-        # 限制页数范围
-        max_pages = max(1, min(max_pages, 5))
-        
-        # 搜索商品
-        products = amazon_scraper.search_products(keyword, category, max_pages)
-        
-        # 转换为字典格式
-        product_list = [product.to_dict() for product in products]
-        
-        result = {
-            'keyword': keyword,
-            'category': category,
-            'pages_searched': max_pages,
-            'total_products': len(product_list),
-            'products': product_list,
-            'search_time': datetime.now().isoformat()
-        }
+        # 抓取是阻塞 I/O，放到线程中执行以免阻塞事件循环
+        result, _ = await asyncio.to_thread(
+            _search_amazon_products_internal, keyword, category, max_pages
+        )
         
-        logger.info(f"搜索完成，找到 {len(product_list)} 个商品")
+        logger.info(f"搜索完成，找到 {result['total_products']} 个商品")
         return result
         
     except Exception as e:
@@ -75,8 +151,89 @@ def search_amazon_products(keyword: str, category: str = "All", max_pages: int =
         }
 
 
+def _clear_caches() -> Dict[str, Any]:
+    """清空所有缓存的同步实现（磁盘缓存的清理为阻塞操作）"""
+    with _search_cache_lock:
+        cleared = len(_search_cache)
+        _search_cache.clear()
+    
+    with _analysis_result_cache_lock:
+        analysis_cleared = len(_analysis_result_cache)
+        _analysis_result_cache.clear()
+    # 磁盘缓存跨进程保留，即使本进程尚未使用也要清理；
+    # 抓取器未创建时直接清理其页面缓存目录，避免仅为清空缓存而创建抓取器
+    analysis_cleared += _analysis_disk_cache().clear()
+    if _scraper.cache_info().currsize:
+        page_cleared = _scraper().clear_page_cache()
+    else:
+        with Cache(str(CACHE_DIR / 'pages')) as page_cache:
+            page_cleared = page_cache.clear()
+    
+    logger.info(f"已清空搜索缓存，共 {cleared} 条；分析缓存 {analysis_cleared} 条；页面缓存 {page_cleared} 条")
+    return {
+        'success': True,
+        'cleared_entries': cleared,
+        'cleared_analysis_entries': analysis_cleared,
+        'cleared_page_entries': page_cleared,
+        'timestamp': _now()
+    }
+
+
+@mcp.tool
+async def clear_search_cache() -> Dict[str, Any]:
+    """清空商品搜索缓存、单页搜索结果缓存和分析结果缓存
+    
+    Returns:
+        包含清除条目数的字典
+    """
+    return await asyncio.to_thread(_clear_caches)
+
+
+def _analyze_products_objs(products: List[ProductInfo], *,
+                           completed_at: Optional[str] = None) -> Dict[str, Any]:
+    """分析 ProductInfo 列表（进程内调用，无需 JSON 解析）"""
+    analysis_result = _analyzer().analyze_products(products, analysis_time=completed_at)
+    
+    logger.info(f"产品分析完成，分析了 {len(products)} 个商品")
+    return analysis_result
+
+
+def _analyze_products_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """分析已解析的商品数据字典（search_amazon_products 的结果格式）"""
+    products_list = data.get('products', [])
+    
+    if not products_list:
+        return {
+            'error': '没有产品数据可供分析',
+            'total_products': 0,
+            'analysis_result': None
+        }
+    
+    # 转换为 ProductInfo 对象
+    products = [ProductInfo.from_dict(p) for p in products_list]
+    
+    return _analyze_products_objs(products)
+
+
+def _analyze_products_json(products_data: str) -> Dict[str, Any]:
+    """解析并分析 JSON 格式的商品数据
+    
+    结果按输入内容缓存 15 分钟，重复分析同一份搜索结果时直接返回缓存结果的副本。
+    """
+    cache_key = hashlib.blake2b(products_data.encode(), digest_size=16).digest()
+    with _analysis_result_cache_lock:
+        cached = _analysis_result_cache.get(cache_key)
+    if cached is not None:
+        return _loads(cached)
+    
+    result = _analyze_products_data(_loads(products_data))
+    with _analysis_result_cache_lock:
+        _analysis_result_cache[cache_key] = _dumps_bytes(result)
+    return result
+
+
 @mcp.tool
-def analyze_products(products_data: str) -> Dict[str, Any]:
+async def analyze_products(products_data: str) -> Dict[str, Any]:
     """分析商品数据，找出最佳商品
     
     Args:
@@ -86,46 +243,9 @@ def analyze_products(products_data: str) -> Dict[str, Any]:
         包含分析结果的字典，包括最佳评分、最高折扣、最佳销量商品
     """
     try:
-        # 解析产品数据
         if isinstance(products_data, str):
-            data = json.loads(products_data)
-        else:
-            data = products_data
-        
-        products_list = data.get('products', [])
-        
-        if not products_list:
-            return {
-                'error': '没有产品数据可供分析',
-                'total_products': 0,
-                'analysis_result': None
-            }
-        
-        # 转换为 ProductInfo 对象
-        from src.amazon_monitor.tools import ProductInfo
-        products = []
-        for p in products_list:
-            product = ProductInfo(
-                title=p.get('title', ''),
-                price=p.get('price'),
-                original_price=p.get('original_price'),
-                rating=p.get('rating'),
-                review_count=p.get('review_count'),
-                discount_percentage=p.get('discount_percentage'),
-                availability=p.get('availability', 'Unknown'),
-                image_url=p.get('image_url'),
-                product_url=p.get('product_url', ''),
-                sales_rank=p.get('sales_rank'),
-                category=p.get('category'),
-                asin=p.get('asin')
-            )
-            products.append(product)
-        
-        # 进行分析
-        analysis_result = product_analyzer.analyze_products(products)
-        
-        logger.info(f"产品分析完成，分析了 {len(products)} 个商品")
-        return analysis_result
+            return await asyncio.to_thread(_analyze_products_json, products_data)
+        return await asyncio.to_thread(_analyze_products_data, products_data)
         
     except Exception as e:
         logger.error(f"分析产品时出错: {e}")
@@ -136,33 +256,11 @@ def analyze_products(products_data: str) -> Dict[str, Any]:
         }
 
 
-@mcp.tool
-def send_email_report(analysis_result: str, recipient_email: str, 
-                     sender_email: str, sender_password: str, 
-                     keyword: str = "Amazon 商品") -> Dict[str, Any]:
-    """发送邮件报告
-    
-    Args:
-        analysis_result: JSON 格式的分析结果字符串
-        recipient_email: 收件人邮箱地址
-        sender_email: 发送者邮箱地址 (推荐使用 Gmail)
-        sender_password: 发送者邮箱密码或应用密码
-        keyword: 搜索关键词，用于邮件标题
-        
-    Returns:
-        包含发送结果的字典
-    """
+def _send_report_dict(data: Dict[str, Any], recipient_email: str, sender_email: str,
+                      sender_password: str, keyword: str) -> Dict[str, Any]:
+    """使用已解析的分析结果发送邮件报告（阻塞调用）"""
     try:
-        # 解析分析结果
-        if isinstance(analysis_result, str):
-            data = json.loads(analysis_result)
-        else:
-            data = analysis_result
-        
-        # 发送邮件
-        success = email_reporter.send_report(
-            data, recipient_email, sender_email, sender_password, keyword
-        )
+        success = _reporter().send_report(data, recipient_email, sender_email, sender_password, keyword)
         
         if success:
             logger.info(f"邮件报告发送成功: {recipient_email}")
@@ -170,7 +268,7 @@ def send_email_report(analysis_result: str, recipient_email: str,
                 'success': True,
                 'message': '邮件发送成功',
                 'recipient': recipient_email,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': _now()
             }
         else:
             return {
@@ -189,7 +287,40 @@ def send_email_report(analysis_result: str, recipient_email: str,
 
 
 @mcp.tool
-def create_product_monitor(keyword: str, category: str = "All", 
+async def send_email_report(analysis_result: Union[str, Dict[str, Any]], recipient_email: str, 
+                     sender_email: str, sender_password: str, 
+                     keyword: str = "Amazon 商品") -> Dict[str, Any]:
+    """发送邮件报告
+    
+    Args:
+        analysis_result: 分析结果（JSON 字符串或字典）
+        recipient_email: 收件人邮箱地址
+        sender_email: 发送者邮箱地址 (推荐使用 Gmail)
+        sender_password: 发送者邮箱密码或应用密码
+        keyword: 搜索关键词，用于邮件标题
+        
+    Returns:
+        包含发送结果的字典
+    """
+    try:
+        # 解析分析结果
+        data = _loads(analysis_result) if isinstance(analysis_result, str) else analysis_result
+    except Exception as e:
+        logger.error(f"发送邮件时出错: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'recipient': recipient_email
+        }
+    
+    # SMTP 是阻塞 I/O，放到线程中执行
+    return await asyncio.to_thread(
+        _send_report_dict, data, recipient_email, sender_email, sender_password, keyword
+    )
+
+
+@mcp.tool
+async def create_product_monitor(keyword: str, category: str = "All", 
                           email: str = "", frequency: str = "daily") -> Dict[str, Any]:
     """创建商品监控任务
     
@@ -197,13 +328,15 @@ def create_product_monitor(keyword: str, category: str = "All",
         keyword: 监控的搜索关键词
         category: 商品类别，可选值: All, Electronics, Books, Clothing, Home, Sports, Toys
         email: 通知邮箱地址（可选）
-        frequency: 监控频率，可选值: daily, weekly, monthly
+        frequency: 监控频率，可选值: hourly, daily, weekly, monthly
         
     Returns:
         包含监控 ID 和创建信息的字典
     """
     try:
-        monitor_id = product_monitor.add_monitor(keyword, category, email, frequency)
+        monitor_id = await asyncio.to_thread(
+            lambda: _monitor().add_monitor(keyword, category, email, frequency)
+        )
         
         logger.info(f"创建商品监控: {keyword} (ID: {monitor_id})")
         return {
@@ -213,7 +346,7 @@ def create_product_monitor(keyword: str, category: str = "All",
             'category': category,
             'email': email,
             'frequency': frequency,
-            'created_at': datetime.now().isoformat()
+            'created_at': _now()
         }
         
     except Exception as e:
@@ -226,7 +359,7 @@ def create_product_monitor(keyword: str, category: str = "All",
 
 
 @mcp.tool
-def run_product_monitor(monitor_id: str, sender_email: str = "", 
+async def run_product_monitor(monitor_id: str, sender_email: str = "", 
                        sender_password: str = "") -> Dict[str, Any]:
     """运行商品监控任务
     
@@ -239,7 +372,9 @@ def run_product_monitor(monitor_id: str, sender_email: str = "",
         包含监控运行结果的字典
     """
     try:
-        result = product_monitor.run_monitor(monitor_id, sender_email, sender_password)
+        result = await asyncio.to_thread(
+            lambda: _monitor().run_monitor(monitor_id, sender_email, sender_password)
+        )
         
         if result['success']:
             logger.info(f"监控运行成功: {monitor_id}")
@@ -258,20 +393,70 @@ def run_product_monitor(monitor_id: str, sender_email: str = "",
 
 
 @mcp.tool
-def list_product_monitors() -> Dict[str, Any]:
+async def run_all_due_monitors(max_concurrent: int = 4, sender_email: str = "",
+                               sender_password: str = "") -> Dict[str, Any]:
+    """并发运行所有到期的商品监控任务
+    
+    Args:
+        max_concurrent: 最大并发运行的监控数
+        sender_email: 发送者邮箱地址（如果需要发送邮件）
+        sender_password: 发送者邮箱密码（如果需要发送邮件）
+        
+    Returns:
+        包含每个监控运行结果的字典
+    """
+    try:
+        # ProductMonitor 可能在此首次创建（读取数据文件），放到线程中执行
+        monitors = await asyncio.to_thread(lambda: _monitor().get_due_monitors())
+        semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        
+        async def run_one(monitor: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await asyncio.to_thread(
+                    lambda: _monitor().run_monitor(monitor['id'], sender_email, sender_password)
+                )
+        
+        results = await asyncio.gather(*map(run_one, monitors))
+        
+        logger.info(f"到期监控运行完成，共 {len(monitors)} 个")
+        return {
+            'success': True,
+            'total_monitors': len(monitors),
+            'succeeded': sum(1 for r in results if r.get('success')),
+            'results': results,
+            'timestamp': _now()
+        }
+        
+    except Exception as e:
+        logger.error(f"运行到期监控时出错: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'results': []
+        }
+
+
+@mcp.tool
+async def list_product_monitors(detailed: bool = False) -> Dict[str, Any]:
     """列出所有商品监控任务
     
+    Args:
+        detailed: 是否返回完整的监控信息（包括通知邮箱和创建时间），默认只返回摘要
+        
     Returns:
         包含所有监控任务的字典
     """
     try:
-        monitors = product_monitor.get_monitors()
+        # ProductMonitor 可能在此首次创建（读取数据文件），放到线程中执行
+        monitors = await asyncio.to_thread(
+            lambda: _monitor().get_monitors() if detailed else _monitor().get_monitor_summaries()
+        )
         
         return {
             'success': True,
             'total_monitors': len(monitors),
             'monitors': monitors,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _now()
         }
         
     except Exception as e:
@@ -284,24 +469,26 @@ def list_product_monitors() -> Dict[str, Any]:
 
 
 @mcp.tool
-def get_monitor_history(monitor_id: str = "") -> Dict[str, Any]:
+async def get_monitor_history(monitor_id: str = "", limit: int = 0) -> Dict[str, Any]:
     """获取监控历史记录
     
     Args:
         monitor_id: 监控任务 ID（可选，如果不提供则返回所有历史记录）
+        limit: 只返回最近的若干条记录（可选，0 表示返回全部）
         
     Returns:
         包含历史记录的字典
     """
     try:
-        history = product_monitor.get_monitor_history(monitor_id)
+        # 运行历史保存在 JSONL 文件中，读取放到线程中执行
+        history = await asyncio.to_thread(lambda: _monitor().get_monitor_history(monitor_id, limit))
         
         return {
             'success': True,
             'monitor_id': monitor_id or 'all',
             'total_records': len(history),
             'history': history,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _now()
         }
         
     except Exception as e:
@@ -314,7 +501,7 @@ def get_monitor_history(monitor_id: str = "") -> Dict[str, Any]:
 
 
 @mcp.tool
-def remove_product_monitor(monitor_id: str) -> Dict[str, Any]:
+async def remove_product_monitor(monitor_id: str) -> Dict[str, Any]:
     """删除商品监控任务
     
     Args:
@@ -324,7 +511,7 @@ def remove_product_monitor(monitor_id: str) -> Dict[str, Any]:
         包含删除结果的字典
     """
     try:
-        success = product_monitor.remove_monitor(monitor_id)
+        success = await asyncio.to_thread(lambda: _monitor().remove_monitor(monitor_id))
         
         if success:
             logger.info(f"删除监控成功: {monitor_id}")
@@ -332,7 +519,7 @@ def remove_product_monitor(monitor_id: str) -> Dict[str, Any]:
                 'success': True,
                 'message': '监控任务删除成功',
                 'monitor_id': monitor_id,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': _now()
             }
         else:
             return {
@@ -350,8 +537,85 @@ def remove_product_monitor(monitor_id: str) -> Dict[str, Any]:
         }
 
 
+# Markdown 报告模板：摘要头部及各推荐商品段落，模块导入时构建一次
+_MD_HEADER_TMPL = Template("""# 🛒 Amazon 商品监控报告
+
+## 📊 搜索信息
+- **关键词**: $keyword
+- **报告时间**: $analysis_time
+- **总商品数**: $total_products
+- **有效商品数**: $valid_products
+
+## 📈 分析摘要
+$analysis_summary
+
+---
+
+""")
+
+# (分析结果字段, 段落标题, 商品模板, 无数据时的提示)
+_MD_SECTIONS = (
+    ('best_rated', "## ⭐ 最佳评分商品\n\n", Template("""### $title
+- **价格**: $$$price
+- **评分**: $rating/5.0
+- **评论数**: $review_count
+- **链接**: [查看商品]($url)
+
+"""), "*未找到评分数据*\n\n"),
+    ('most_discounted', "## 💰 最高折扣商品\n\n", Template("""### $title
+- **价格**: $$$price
+- **估计折扣**: $discount%
+- **评分**: $rating/5.0
+- **链接**: [查看商品]($url)
+
+"""), "*未找到折扣商品*\n\n"),
+    ('best_seller', "## 🔥 最佳销量商品\n\n", Template("""### $title
+- **价格**: $$$price
+- **评论数**: $review_count
+- **评分**: $rating/5.0
+- **链接**: [查看商品]($url)
+
+"""), "*未找到销量数据*\n\n")
+)
+
+_MD_FOOTER = "---\n\n*此报告由 Amazon 商品监控系统自动生成*"
+
+
+def _render_markdown_report(data: Dict[str, Any], keyword: str) -> str:
+    """根据分析结果字典生成 Markdown 报告"""
+    # 各段落先收集到列表中，最后一次性拼接
+    parts = [_MD_HEADER_TMPL.substitute(
+        keyword=keyword,
+        analysis_time=data.get('analysis_time', _now()),
+        total_products=data.get('total_products', 0),
+        valid_products=data.get('valid_products', 0),
+        analysis_summary=data.get('analysis_summary', '无分析数据')
+    )]
+    
+    # 最佳评分、最高折扣、最佳销量商品
+    for key, heading, product_tmpl, empty_text in _MD_SECTIONS:
+        parts.append(heading)
+        product = data.get(key)
+        if product:
+            get = product.get
+            parts.append(product_tmpl.substitute(
+                title=get('title', '未知商品'),
+                price=f"{get('price', 0):.2f}",
+                discount=f"{get('discount_percentage') or 0:.1f}",
+                rating=get('rating', 'N/A'),
+                review_count=get('review_count', 0),
+                url=add_affiliate_id_to_url(get('product_url', '#'))
+            ))
+        else:
+            parts.append(empty_text)
+    
+    parts.append(_MD_FOOTER)
+    
+    return "".join(parts)
+
+
 @mcp.tool
-def generate_markdown_report(analysis_result: str, keyword: str = "Amazon 商品") -> str:
+async def generate_markdown_report(analysis_result: str, keyword: str = "Amazon 商品") -> str:
     """生成 Markdown 格式的分析报告
     
     Args:
@@ -364,130 +628,73 @@ def generate_markdown_report(analysis_result: str, keyword: str = "Amazon 商品
     try:
         # 解析分析结果
         if isinstance(analysis_result, str):
-            data = json.loads(analysis_result)
+            data = _loads(analysis_result)
         else:
             data = analysis_result
         
-        # 生成 Markdown 报告
-        markdown = f"""# 🛒 Amazon 商品监控报告
-
-## 📊 搜索信息
-- **关键词**: {keyword}
-- **报告时间**: {data.get('analysis_time', datetime.now().isoformat())}
-- **总商品数**: {data.get('total_products', 0)}
-- **有效商品数**: {data.get('valid_products', 0)}
-
-## 📈 分析摘要
-{data.get('analysis_summary', '无分析数据')}
-
----
-
-"""
-        
-        # 最佳评分商品
-        best_rated = data.get('best_rated')
-        markdown += "## ⭐ 最佳评分商品\n\n"
-        if best_rated:
-            affiliate_url = add_affiliate_id_to_url(best_rated.get('product_url', '#'))
-            markdown += f"""### {best_rated.get('title', '未知商品')}
-- **价格**: ${best_rated.get('price', 0):.2f}
-- **评分**: {best_rated.get('rating', 'N/A')}/5.0
-- **评论数**: {best_rated.get('review_count', 0)}
-- **链接**: [查看商品]({affiliate_url})
-
-"""
-        else:
-            markdown += "*未找到评分数据*\n\n"
-        
-        # 最高折扣商品
-        most_discounted = data.get('most_discounted')
-        markdown += "## 💰 最高折扣商品\n\n"
-        if most_discounted:
-            discount = most_discounted.get('discount_percentage', 0)
-            affiliate_url = add_affiliate_id_to_url(most_discounted.get('product_url', '#'))
-            markdown += f"""### {most_discounted.get('title', '未知商品')}
-- **价格**: ${most_discounted.get('price', 0):.2f}
-- **估计折扣**: {discount:.1f}%
-- **评分**: {most_discounted.get('rating', 'N/A')}/5.0
-- **链接**: [查看商品]({affiliate_url})
-
-"""
-        else:
-            markdown += "*未找到折扣商品*\n\n"
-        
-        # 最佳销量商品
-        best_seller = data.get('best_seller')
-        markdown += "## 🔥 最佳销量商品\n\n"
-        if best_seller:
-            affiliate_url = add_affiliate_id_to_url(best_seller.get('product_url', '#'))
-            markdown += f"""### {best_seller.get('title', '未知商品')}
-- **价格**: ${best_seller.get('price', 0):.2f}
-- **评论数**: {best_seller.get('review_count', 0)}
-- **评分**: {best_seller.get('rating', 'N/A')}/5.0
-- **链接**: [查看商品]({affiliate_url})
-
-"""
-        else:
-            markdown += "*未找到销量数据*\n\n"
-        
-        markdown += "---\n\n*此报告由 Amazon 商品监控系统自动生成*"
-        
-        return markdown
+        return await asyncio.to_thread(_render_markdown_report, data, keyword)
         
     except Exception as e:
         logger.error(f"生成 Markdown 报告时出错: {e}")
         return f"生成报告时出错: {e}"
 
 
-@mcp.tool
-def run_complete_analysis(keyword: str, category: str = "All", 
-                         max_pages: int = 2) -> Dict[str, Any]:
-    """运行完整的商品分析流程
-    
-    Args:
-        keyword: 搜索关键词
-        category: 商品类别
-        max_pages: 最大搜索页数
-        
-    Returns:
-        包含搜索结果和分析结果的完整字典
-    """
+def _run_complete_analysis(keyword: str, category: str, max_pages: int) -> Dict[str, Any]:
+    """完整分析流程的同步实现，成功结果按小时缓存到磁盘"""
     try:
         logger.info(f"开始完整分析流程: {keyword}")
         
-        # 步骤 1: 搜索商品
-        search_result = search_amazon_products(keyword, category, max_pages)
-        
-        if search_result.get('error'):
+        hour_bucket = datetime.now(timezone.utc).strftime('%Y%m%d%H')
+        cache_key = hashlib.sha256(
+            f"{keyword}|{category}|{max_pages}|{hour_bucket}".encode()
+        ).hexdigest()
+        cached = _analysis_disk_cache().get(cache_key)
+        if cached is not None:
+            logger.info(f"命中完整分析缓存: {keyword}")
+            return cached
+        
+        # 整个流程只取一次时间戳，各步骤共用
+        now = _now()
+        
+        # 步骤 1: 搜索商品（直接复用 ProductInfo 对象，避免 JSON 往返）
+        try:
+            search_result, products = _search_amazon_products_internal(
+                keyword, category, max_pages, completed_at=now
+            )
+        except Exception as e:
+            logger.error(f"搜索商品时出错: {e}")
             return {
                 'success': False,
-                'error': f"搜索失败: {search_result['error']}",
+                'error': f"搜索失败: {e}",
                 'keyword': keyword
             }
         
-        # 步骤 2: 分析商品
-        analysis_result = analyze_products(search_result)
-        
-        if analysis_result.get('error'):
+        if not products:
             return {
                 'success': False,
-                'error': f"分析失败: {analysis_result['error']}",
+                'error': "分析失败: 没有产品数据可供分析",
                 'keyword': keyword,
                 'search_result': search_result
             }
         
+        # 步骤 2: 分析商品
+        analysis_result = _analyze_products_objs(products, completed_at=now)
+        
         # 步骤 3: 生成报告
-        markdown_report = generate_markdown_report(analysis_result, keyword)
+        markdown_report = _render_markdown_report(analysis_result, keyword)
         
         logger.info(f"完整分析流程完成: {keyword}")
-        return {
+        result = {
             'success': True,
             'keyword': keyword,
             'search_result': search_result,
             'analysis_result': analysis_result,
             'markdown_report': markdown_report,
-            'completed_at': datetime.now().isoformat()
+            'completed_at': now
         }
+        _analysis_disk_cache().set(cache_key, result, expire=3600)
+        
+        return result
         
     except Exception as e:
         logger.error(f"完整分析流程出错: {e}")
@@ -498,6 +705,115 @@ def run_complete_analysis(keyword: str, category: str = "All",
         }
 
 
+@mcp.tool
+async def run_complete_analysis(keyword: str, category: str = "All", 
+                         max_pages: int = 2) -> Dict[str, Any]:
+    """运行完整的商品分析流程
+    
+    Args:
+        keyword: 搜索关键词
+        category: 商品类别
+        max_pages: 最大搜索页数
+        
+    Returns:
+        包含搜索结果和分析结果的完整字典
+    """
+    # 整个流程包含抓取等阻塞操作，放到线程中执行
+    return await asyncio.to_thread(_run_complete_analysis, keyword, category, max_pages)
+
+
+# 可通过 batch_execute 调用的工具（工具名 -> 原始函数）；
+# 与单独调用工具时一样，先按函数签名校验并转换参数类型，参数不合法时抛出 ValidationError
+_TOOLS = {
+    tool.name: validate_call(tool.fn)
+    for tool in (
+        search_amazon_products, clear_search_cache, analyze_products,
+        send_email_report, create_product_monitor, run_product_monitor,
+        run_all_due_monitors, list_product_monitors, get_monitor_history, remove_product_monitor,
+        generate_markdown_report, run_complete_analysis
+    )
+}
+
+
+async def _maybe_await(value):
+    """如果是协程则等待其结果，否则直接返回"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+@mcp.tool
+async def batch_execute(calls: List[Dict[str, Any]], max_concurrent: int = 8,
+                        stop_on_error: bool = False) -> Dict[str, Any]:
+    """在一次请求中批量执行多个工具调用
+    
+    Args:
+        calls: 调用列表，每项格式为 {"name": 工具名, "args": 参数字典}
+        max_concurrent: 最大并发调用数
+        stop_on_error: 任一调用出错时是否立即停止，并取消其余尚未完成的调用
+        
+    Returns:
+        包含每个调用结果的字典，结果顺序与 calls 一致；
+        提前停止时包含已完成调用的结果和出错调用的序号 failed_index
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    
+    async def run(call: Dict[str, Any]) -> Dict[str, Any]:
+        name = call.get('name')
+        try:
+            fn = _TOOLS.get(name)
+            if fn is None:
+                raise ValueError(f"未知工具: {name}")
+            
+            async with semaphore:
+                result = await _maybe_await(fn(**(call.get('args') or {})))
+            return {'name': name, 'success': True, 'result': result}
+        except Exception as e:
+            if stop_on_error:
+                raise
+            return {'name': name, 'success': False, 'error': str(e)}
+    
+    # stop_on_error 时任一调用出错，TaskGroup 会取消其余尚未完成的调用
+    # （已在线程中执行的阻塞操作无法中断，但其结果不再等待）
+    tasks = []
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(run(call)) for call in calls]
+    except* Exception:
+        pass
+    
+    results = []
+    failed_index = None
+    first_error = None
+    for index, (call, task) in enumerate(zip(calls, tasks)):
+        if task.cancelled():
+            results.append({'name': call.get('name'), 'success': False, 'cancelled': True,
+                            'error': '调用已取消'})
+        elif task.exception() is not None:
+            if failed_index is None:
+                failed_index = index
+                first_error = task.exception()
+            results.append({'name': call.get('name'), 'success': False, 'error': str(task.exception())})
+        else:
+            results.append(task.result())
+    
+    response = {
+        'success': all(r['success'] for r in results),
+        'total_calls': len(calls),
+        'results': results,
+        'timestamp': _now()
+    }
+    
+    if failed_index is not None:
+        logger.error(f"批量执行在第 {failed_index} 个调用出错后停止: {first_error}")
+        response['error'] = str(first_error)
+        response['failed_index'] = failed_index
+    else:
+        logger.info(f"批量执行完成，共 {len(calls)} 个调用")
+    
+    return response
+
+
 # Prompt 定义
 @mcp.prompt
 def amazon_product_analysis_prompt(keyword: str) -> str:
@@ -543,34 +859,63 @@ def email_report_prompt(keyword: str, recipient_email: str) -> str:
 
 
 # 资源定义
-@mcp.resource("monitor://data")
-def monitor_data_resource() -> str:
-    """商品监控数据资源
-    
-    Returns:
-        当前所有监控任务的 JSON 数据
-    """
+def _monitor_data_json() -> str:
+    """读取监控数据和运行历史并序列化为 JSON（阻塞调用）"""
     try:
-        monitors = product_monitor.get_monitors()
-        history = product_monitor.get_monitor_history()
+        monitors = _monitor().get_monitors()
+        history = _monitor().get_monitor_history()
         
         data = {
             'monitors': monitors,
             'history': history,
-            'last_updated': datetime.now().isoformat()
+            'last_updated': _now()
         }
         
-        return json.dumps(data, ensure_ascii=False, indent=2)
+        return _dumps(data)
+        
+    except Exception as e:
+        return _dumps({'error': str(e)})
+
+
+@mcp.resource("monitor://data")
+async def monitor_data_resource() -> str:
+    """商品监控数据资源
+    
+    Returns:
+        当前所有监控任务的 JSON 数据
+    """
+    return await asyncio.to_thread(_monitor_data_json)
+
+
+def _monitor_history_ndjson() -> str:
+    """读取运行历史并序列化为 NDJSON（阻塞调用）"""
+    try:
+        history = _monitor().get_monitor_history()
+        return "\n".join(_dumps(record) for record in history)
         
     except Exception as e:
-        return json.dumps({'error': str(e)}, ensure_ascii=False)
+        return _dumps({'error': str(e)})
+
+
+@mcp.resource("monitor://data.ndjson")
+async def monitor_history_ndjson_resource() -> str:
+    """商品监控历史资源（NDJSON 格式）
+    
+    Returns:
+        每行一条监控历史记录的 NDJSON 数据
+    """
+    return await asyncio.to_thread(_monitor_history_ndjson)
 
 
 def cleanup():
     """清理资源"""
     try:
-        product_monitor.close()
-        amazon_scraper.close()
+        if _monitor.cache_info().currsize:
+            _monitor().close()
+        if _scraper.cache_info().currsize:
+            _scraper().close()
+        if _analysis_disk_cache.cache_info().currsize:
+            _analysis_disk_cache().close()
         logger.info("资源清理完成")
     except Exception as e:
         logger.error(f"清理资源时出错: {e}")
@@ -3,38 +3,214 @@
 提供 Amazon 商品监控、分析和邮件通知的核心工具。
 """
 
+import os
+import atexit
+import re
 import json
-import smtplib
+import hashlib
+import time
+import statistics
 import logging
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import multiprocessing
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Callable
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from html import escape
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from string import Template
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote_plus
 
 import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from diskcache import Cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # orjson 不可用时回退到标准库 json
+    orjson = None
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # lxml 不可用时回退到 BeautifulSoup 内置解析器
+    lxml_html = None
+
+if TYPE_CHECKING:  # 邮件模块仅在发送时导入，这里只用于类型注解
+    from email.mime.multipart import MIMEMultipart
 
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _env_number(name: str, default: str, cast: Callable[[str], Any], minimum):
+    """读取数值型环境变量，小于 minimum 时按 minimum 处理"""
+    raw = os.getenv(name, default)
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValueError(f"环境变量 {name} 必须是有效的数字，当前值: {raw!r}") from None
+    
+    if value != value or value in (float('inf'), float('-inf')):
+        raise ValueError(f"环境变量 {name} 必须是有限的数字，当前值: {raw!r}")
+    if value < minimum:
+        logger.warning(f"环境变量 {name}={raw!r} 小于允许的最小值 {minimum}，已按 {minimum} 处理")
+        return minimum
+    return value
+
+
 # Amazon 联盟 ID
 AFFILIATE_ID = "joweaipmclub-20"
 
+# 监控频率对应的运行间隔
+FREQUENCY_INTERVALS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'monthly': timedelta(days=30)
+}
+
+# 监控摘要包含的字段（list_product_monitors 默认只返回这些字段）
+MONITOR_SUMMARY_FIELDS = ('id', 'keyword', 'category', 'frequency', 'active', 'last_run')
+
+# Amazon 搜索页地址与搜索结果选择器
+SEARCH_BASE_URL = "https://www.amazon.com/s"
+SEARCH_RESULT_SELECTOR = '[data-component-type="s-search-result"]'
+
+# 搜索页请求限速：两次请求的最小平均间隔（秒，可通过 AMAZON_MIN_INTERVAL 覆盖，至少 0.01 秒）、
+# 每秒发放的令牌数和令牌桶容量；被限流后暂停请求的秒数。限速在同一进程内共享
+MIN_REQUEST_INTERVAL = _env_number('AMAZON_MIN_INTERVAL', '1.0', float, 0.01)
+REQUEST_RATE = 1.0 / MIN_REQUEST_INTERVAL
+REQUEST_BURST = 3
+RATE_LIMIT_PENALTY = 5.0
+
+# 同一进程内同时进行中的搜索页请求上限，可通过 AMAZON_MAX_CONCURRENCY 覆盖（至少 1）
+MAX_CONCURRENCY = _env_number('AMAZON_MAX_CONCURRENCY', '2', int, 1)
+
+# 表示被 Amazon 限流的状态码和验证码页面标记
+RATE_LIMIT_STATUSES = (429, 503)
+CAPTCHA_MARKER = 'validateCaptcha'
+
+# HTTP 适配器自动重试的临时性网关错误（不含限流状态码，限流只由令牌桶退避）
+RETRY_STATUSES = (502, 504)
+
+# Selenium 抓取时屏蔽的资源（图片、样式表和跟踪脚本），不影响商品数据解析
+BLOCKED_RESOURCE_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.css",
+    "*googletagmanager*", "*doubleclick*"
+]
+
+# 查询字符串中的 tag 参数
+_TAG_PARAM_RE = re.compile(r'([?&])tag=[^&#]*')
+
+# 域名包含 amazon.com 的链接
+_AMAZON_URL_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://[^/?#]*amazon\.com')
+
+# 在浏览器中批量提取搜索结果卡片字段的脚本，参数为卡片选择器和最大数量
+_EXTRACT_CARDS_JS = """
+return Array.from(document.querySelectorAll(arguments[0])).slice(0, arguments[1]).map(el => ({
+    title: el.querySelector('h2 a span')?.innerText,
+    href: el.querySelector('h2 a')?.href,
+    price: el.querySelector('.a-price-whole')?.innerText,
+    rating: el.querySelector('[aria-label*="stars"]')?.getAttribute('aria-label'),
+    reviews: el.querySelector('a[href*="#customerReviews"]')?.innerText,
+    img: el.querySelector('img')?.src
+}));
+"""
+
+# 价格、评论数文本中需去掉的千位分隔符、货币符号和空白，一次 translate 完成
+_STRIP_NUMBER = str.maketrans('', '', ',$ \t\r\n')
+
+# 商品链接中的 ASIN
+_ASIN_RE = re.compile(r'/dp/([A-Z0-9]{10})')
+
+# 评分文本（如 "4.5 out of 5 stars"）中的评分
+_RATING_RE = re.compile(r'(\d+(?:\.\d+)?)\s+out of')
+
+# 搜索结果卡片及各字段的预编译 XPath
+if lxml_html is not None:
+    _XP_RESULTS = etree.XPath('//div[@data-component-type="s-search-result"]')
+    _XP_TITLE = etree.XPath('string((.//h2)[1])')
+    _XP_LINK = etree.XPath('(.//h2)[1]//a[1]/@href')
+    _XP_PRICE = etree.XPath('string((.//span[contains(concat(" ", normalize-space(@class), " "), " a-price-whole ")])[1])')
+    _XP_RATING = etree.XPath('(.//span[@aria-label])[1]/@aria-label')
+    _XP_REVIEWS = etree.XPath('string((.//a[contains(@href, "#customerReviews")])[1])')
+    _XP_IMAGE = etree.XPath('(.//img)[1]/@src')
+
+# 每个线程复用一个 lxml HTML 解析器（解析器对象不宜跨线程共享）
+_html_parsers = threading.local()
+
+
+def _html_parser():
+    """返回当前线程的 UTF-8 HTML 解析器"""
+    parser = getattr(_html_parsers, 'parser', None)
+    if parser is None:
+        parser = _html_parsers.parser = lxml_html.HTMLParser(encoding='utf-8')
+    return parser
+
+
+# 商品类别 ID（简化版本）
+_CATEGORY_IDS = {
+    'Electronics': '172282',
+    'Books': '283155',
+    'Clothing': '7141123011',
+    'Home': '1055398',
+    'Sports': '3375251',
+    'Toys': '165793011'
+}
+
+# 预先生成各类别的 rh 筛选参数，构建搜索参数时直接取用
+_CATEGORY_FILTERS = {category: f'n:{category_id}' for category, category_id in _CATEGORY_IDS.items()}
+
+# 磁盘缓存目录，可通过 AMAZON_MONITOR_CACHE_DIR 环境变量覆盖
+CACHE_DIR = Path(os.getenv('AMAZON_MONITOR_CACHE_DIR', Path.home() / '.cache' / 'amazon_monitor'))
+
+# 监控数据两次写盘之间的最短间隔（秒），期间的修改合并为一次写入
+SAVE_DEBOUNCE_SECONDS = 1.0
+
+# 单页搜索结果缓存的过期时间（秒）
+PAGE_CACHE_TTL = 3600
+
+
+def json_loads(data):
+    """解析 JSON 字符串或字节串（优先使用 orjson）
+    
+    orjson 拒绝 NaN/Infinity 等标准库可接受的写法，此时回退到 json 以保持兼容。
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except (orjson.JSONDecodeError, TypeError):
+            pass
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 编码的 JSON 字节串（优先使用 orjson）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def json_dumps(obj: Any, indent: bool = False) -> str:
+    """序列化为 JSON 字符串（优先使用 orjson，输出保留非 ASCII 字符）"""
+    return json_dumps_bytes(obj, indent).decode('utf-8')
+
+
+@lru_cache(maxsize=8192)
 def add_affiliate_id_to_url(url: str, affiliate_id: str = AFFILIATE_ID) -> str:
     """为 Amazon URL 添加联盟 ID
     
+    纯字符串转换，结果按 (url, affiliate_id) 缓存；同一商品链接在多次报告中反复出现。
+    
     Args:
         url: 原始 Amazon 商品 URL
         affiliate_id: Amazon 联盟 ID
@@ -45,43 +221,42 @@ def add_affiliate_id_to_url(url: str, affiliate_id: str = AFFILIATE_ID) -> str:
     if not url or not affiliate_id:
         return url
     
+    # 快速路径：没有片段的 Amazon 链接直接做字符串替换，已有唯一的 tag 参数时原地替换其值，
+    # 没有时在末尾追加；tag 重复出现时交给下面的完整解析合并
+    if '#' not in url and _AMAZON_URL_RE.match(url):
+        tagged, count = _TAG_PARAM_RE.subn(lambda m: f"{m.group(1)}tag={affiliate_id}", url)
+        if count == 1:
+            return tagged
+        if count == 0:
+            separator = '' if url.endswith(('?', '&')) else ('&' if '?' in url else '?')
+            return f"{url}{separator}tag={affiliate_id}"
+    
     try:
         # 解析 URL
-        parsed = urlparse(url)
+        parts = urlsplit(url)
         
         # 确保是 Amazon 域名
-        if 'amazon.com' not in parsed.netloc:
+        if 'amazon.com' not in parts.netloc:
             return url
         
-        # 解析查询参数
-        query_params = parse_qs(parsed.query)
-        
-        # 添加或更新 tag 参数
-        query_params['tag'] = [affiliate_id]
-        
-        # 重新构建查询字符串
-        new_query = urlencode(query_params, doseq=True)
+        # 去掉原有的 tag 参数后在末尾加上新的 tag；其余参数（包括重复参数和空值参数）保持原有顺序
+        query_pairs = [
+            (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key != 'tag'
+        ]
+        query_pairs.append(('tag', affiliate_id))
         
         # 重新构建 URL
-        new_url = urlunparse((
-            parsed.scheme,
-            parsed.netloc,
-            parsed.path,
-            parsed.params,
-            new_query,
-            parsed.fragment
-        ))
-        
-        return new_url
+        return urlunsplit(parts._replace(query=urlencode(query_pairs)))
         
     except Exception as e:
         logger.warning(f"添加联盟 ID 失败: {e}")
         return url
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ProductInfo:
-    """商品信息数据类"""
+    """商品信息数据类（不可变，需修改字段时用 dataclasses.replace 生成副本）"""
     title: str
     price: Optional[float]
     original_price: Optional[float]
@@ -111,29 +286,134 @@ class ProductInfo:
             'category': self.category,
             'asin': self.asin
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProductInfo':
+        """从字典（如 to_dict() 的结果）重建商品信息，缺失字段使用默认值"""
+        return cls(*map(data.get, _PRODUCT_FIELD_NAMES, _PRODUCT_FIELD_DEFAULTS))
+
+
+# ProductInfo 字段名及其缺省值，按定义顺序排列，供 from_dict 按位置构造
+_PRODUCT_FIELD_NAMES = tuple(f.name for f in fields(ProductInfo))
+_PRODUCT_FIELD_DEFAULTS = tuple(
+    {'title': '', 'availability': 'Unknown', 'product_url': ''}.get(name)
+    for name in _PRODUCT_FIELD_NAMES
+)
+
+
+def _page_cache_key(keyword: str, category: str, page: int) -> str:
+    """单页搜索结果的缓存键，按小时分桶"""
+    hour_bucket = datetime.now(timezone.utc).strftime('%Y%m%d%H')
+    return hashlib.blake2b(
+        f"{keyword.lower().strip()}|{category}|{page}|{hour_bucket}".encode(), digest_size=16
+    ).hexdigest()
+
+
+class _TokenBucket:
+    """线程安全的令牌桶限速器
+    
+    正常情况下允许短时突发请求，只有令牌耗尽或被限流后才需要等待。
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """取得一个令牌，必要时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            
+            time.sleep(wait)
+    
+    def penalize(self, sleep_seconds: float):
+        """被限流后清空令牌并暂停发放一段时间"""
+        with self._lock:
+            self._tokens = 0.0
+            self._blocked_until = max(self._blocked_until, time.monotonic() + sleep_seconds)
+
+
+# 同一进程内所有 AmazonScraper 共用的限速器和请求槽位，创建多个抓取器不会放大请求速率；
+# 限速按进程计算，多个进程各自独立计数
+_REQUEST_BUCKET = _TokenBucket(rate=REQUEST_RATE, capacity=REQUEST_BURST)
+_REQUEST_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENCY)
 
 
 class AmazonScraper:
     """Amazon 商品抓取器"""
     
-    def __init__(self, headless: bool = True, wait_timeout: int = 10):
+    def __init__(self, headless: bool = True, wait_timeout: int = 10,
+                 max_concurrency: int = MAX_CONCURRENCY):
         self.headless = headless
         self.wait_timeout = wait_timeout
+        self.max_concurrency = max(1, max_concurrency)
         self.driver = None
+        # 进程内所有页面请求共用一个限速器，只在被限流时才退避等待
+        self._rate = _REQUEST_BUCKET
+        # 限制进程内同时进行中的请求数（跨多个抓取器和并发的搜索调用），避免触发限流后的重试风暴
+        self._request_slots = _REQUEST_SLOTS
+        # 长期复用的页面抓取线程池，线程按需创建，多次搜索之间无需重复创建和销毁
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix='amazon-page')
+        # WebDriver 不是线程安全的，同一时间只允许一个搜索使用浏览器
+        self._driver_lock = threading.RLock()
         self.session = requests.Session()
+        # 解析后的单页搜索结果缓存，多个监控、多个进程共享；首次使用时才打开，
+        # 只创建抓取器（如每个 ProductMonitor 和监控工作进程）不会访问缓存目录
+        self._page_cache = None
+        self._page_cache_lock = threading.Lock()
+        
+        # 复用连接池，避免每页重新进行 DNS/TCP/TLS 握手；连接失败或网关错误时自动重试。
+        # 限流状态码（429/503）不在此重试，由 _search_with_requests 交给令牌桶统一退避
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=['GET'],
+                raise_on_status=False
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # 设置请求头模拟真实浏览器
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
+            # 安装了 brotli 时 urllib3 会在此加入 br，压缩率高于 gzip
+            'Accept-Encoding': ACCEPT_ENCODING,
             'Connection': 'keep-alive',
         })
     
-    def _setup_driver(self) -> webdriver.Chrome:
-        """初始化 Chrome WebDriver"""
+    def _setup_driver(self):
+        """初始化 Chrome WebDriver（调用方需持有 _driver_lock）"""
         if self.driver is None:
+            # Selenium 导入较慢，只在首次需要浏览器时才加载
+            try:
+                from selenium import webdriver
+                from selenium.webdriver.chrome.options import Options
+            except ImportError as e:
+                logger.warning(f"无法导入 Selenium: {e}. 将使用 requests 方式")
+                return None
+            
             options = Options()
             if self.headless:
                 options.add_argument('--headless')
@@ -142,10 +422,15 @@ class AmazonScraper:
             options.add_argument('--disable-blink-features=AutomationControlled')
             options.add_experimental_option("excludeSwitches", ["enable-automation"])
             options.add_experimental_option('useAutomationExtension', False)
+            # 搜索结果的文本和链接在 DOMContentLoaded 时已就绪，无需等待图片、广告等子资源
+            options.page_load_strategy = 'eager'
+            options.add_argument('--blink-settings=imagesEnabled=false')
             
             try:
                 self.driver = webdriver.Chrome(options=options)
                 self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+                self.driver.execute_cdp_cmd("Network.enable", {})
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_URLS})
             except Exception as e:
                 logger.warning(f"无法启动 Chrome WebDriver: {e}. 将使用 requests 方式")
                 self.driver = None
@@ -163,62 +448,135 @@ class AmazonScraper:
         Returns:
             商品信息列表
         """
+        # Selenium 驱动共享同一个浏览器，只能持锁逐页抓取；requests 方式可并发抓取所有页
+        page_results = None
+        with self._driver_lock:
+            if self._setup_driver():
+                page_results = self._search_pages_serially(keyword, category, max_pages)
+        
+        if page_results is None:
+            page_results = self._search_pages_concurrently(keyword, category, max_pages)
+        
         products = []
+        seen_asins = set()
+        
+        # 同一商品（如赞助位）经常在多个结果页重复出现，按 ASIN 去重
+        for page_products in page_results:
+            for product in page_products:
+                if product.asin:
+                    if product.asin in seen_asins:
+                        continue
+                    seen_asins.add(product.asin)
+                products.append(product)
+        
+        return products
+    
+    def _search_pages_serially(self, keyword: str, category: str, max_pages: int) -> List[List[ProductInfo]]:
+        """逐页搜索（Selenium 方式）"""
+        page_results = []
         
         for page in range(1, max_pages + 1):
             try:
-                page_products = self._search_page(keyword, category, page)
-                products.extend(page_products)
-                
-                # 避免请求过于频繁
-                if page < max_pages:
-                    import time
-                    time.sleep(2)
-                    
+                page_results.append(self._search_page(keyword, category, page))
             except Exception as e:
                 logger.error(f"搜索第 {page} 页时出错: {e}")
                 continue
         
-        return products
+        return page_results
     
-    def _search_page(self, keyword: str, category: str, page: int) -> List[ProductInfo]:
-        """搜索单页商品"""
-        # 构建搜索 URL
-        base_url = "https://www.amazon.com/s"
+    def _search_pages_concurrently(self, keyword: str, category: str, max_pages: int) -> List[List[ProductInfo]]:
+        """并发搜索多页（requests 方式），总耗时约等于最慢一页的耗时"""
+        page_results = []
+        futures = [
+            self._executor.submit(self._cached_page, keyword, category, page, self._search_with_requests)
+            for page in range(1, max_pages + 1)
+        ]
+        
+        # 按页码顺序收集结果
+        for page, future in enumerate(futures, 1):
+            try:
+                page_results.append(future.result())
+            except Exception as e:
+                logger.error(f"搜索第 {page} 页时出错: {e}")
+        
+        return page_results
+    
+    def _build_search_params(self, keyword: str, category: str, page: int) -> Dict[str, Any]:
+        """构建搜索参数"""
         params = {
             'k': keyword,
             'page': page
         }
         
+        # "All" 不需要类别筛选，直接跳过查表
         if category != "All":
-            params['rh'] = f'n:{self._get_category_id(category)}'
+            category_filter = _CATEGORY_FILTERS.get(category)
+            if category_filter:
+                params['rh'] = category_filter
         
+        return params
+    
+    def _build_search_url(self, base_url: str, params: Dict[str, Any]) -> str:
+        """构建完整搜索 URL，关键词中的空格、& 等字符会被正确编码"""
+        return f"{base_url}?{urlencode(params, quote_via=quote_plus)}"
+    
+    def _search_page(self, keyword: str, category: str, page: int) -> List[ProductInfo]:
+        """搜索单页商品"""
         # 尝试使用 Selenium
         driver = self._setup_driver()
         if driver:
-            return self._search_with_selenium(base_url, params)
+            return self._cached_page(keyword, category, page, self._search_with_selenium)
         else:
-            return self._search_with_requests(base_url, params)
+            return self._cached_page(keyword, category, page, self._search_with_requests)
+    
+    def _pages(self) -> Cache:
+        """获取单页搜索结果缓存，首次调用时打开"""
+        with self._page_cache_lock:
+            if self._page_cache is None:
+                self._page_cache = Cache(str(CACHE_DIR / 'pages'))
+            return self._page_cache
+    
+    def _cached_page(self, keyword: str, category: str, page: int,
+                     fetch: Callable[[str, Dict], List[ProductInfo]]) -> List[ProductInfo]:
+        """获取单页搜索结果，同一小时内相同关键词、类别和页码直接复用磁盘缓存"""
+        cache_key = _page_cache_key(keyword, category, page)
+        cached = self._pages().get(cache_key)
+        if cached is not None:
+            logger.info(f"命中页面缓存: {keyword} 第 {page} 页")
+            return cached
+        
+        products = fetch(SEARCH_BASE_URL, self._build_search_params(keyword, category, page))
+        
+        # 只缓存有结果的页面，避免缓存限流或临时失败
+        if products:
+            self._pages().set(cache_key, products, expire=PAGE_CACHE_TTL)
+        
+        return products
     
     def _search_with_selenium(self, base_url: str, params: Dict) -> List[ProductInfo]:
         """使用 Selenium 搜索"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        
         try:
-            # 构建完整 URL
-            url = base_url + '?' + '&'.join([f'{k}={v}' for k, v in params.items()])
+            url = self._build_search_url(base_url, params)
             
+            self._rate.acquire()
             self.driver.get(url)
             
             # 等待搜索结果加载
             wait = WebDriverWait(self.driver, self.wait_timeout)
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '[data-component-type="s-search-result"]')))
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, SEARCH_RESULT_SELECTOR)))
             
-            # 解析商品信息
-            products = []
-            product_elements = self.driver.find_elements(By.CSS_SELECTOR, '[data-component-type="s-search-result"]')
+            # 在浏览器内一次性提取所有商品卡片的字段，避免逐个元素往返 WebDriver
+            cards = self.driver.execute_script(_EXTRACT_CARDS_JS, SEARCH_RESULT_SELECTOR, 20)  # 限制每页最多 20 个商品
             
-            for element in product_elements[:20]:  # 限制每页最多 20 个商品
+            products = []
+            for card in cards or []:
                 try:
-                    product = self._parse_product_element_selenium(element)
+                    product = self._product_from_card(card)
                     if product:
                         products.append(product)
                 except Exception as e:
@@ -228,7 +586,11 @@ class AmazonScraper:
             return products
             
         except TimeoutException:
-            logger.error("页面加载超时")
+            if CAPTCHA_MARKER in self.driver.page_source:
+                logger.warning("遇到验证码页面，暂停请求")
+                self._rate.penalize(RATE_LIMIT_PENALTY)
+            else:
+                logger.error("页面加载超时")
             return []
         except WebDriverException as e:
             logger.error(f"WebDriver 错误: {e}")
@@ -237,206 +599,170 @@ class AmazonScraper:
     def _search_with_requests(self, base_url: str, params: Dict) -> List[ProductInfo]:
         """使用 requests 搜索（备用方案）"""
         try:
-            url = base_url + '?' + '&'.join([f'{k}={v}' for k, v in params.items()])
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            url = self._build_search_url(base_url, params)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            products = []
+            with self._request_slots:
+                self._rate.acquire()
+                response = self.session.get(url, timeout=10)
             
-            # 查找商品元素
-            product_elements = soup.find_all('div', {'data-component-type': 's-search-result'})
+            if response.status_code in RATE_LIMIT_STATUSES or CAPTCHA_MARKER.encode() in response.content:
+                logger.warning(f"请求被限流 (状态码 {response.status_code})，暂停请求")
+                self._rate.penalize(RATE_LIMIT_PENALTY)
+                return []
             
-            for element in product_elements[:20]:  # 限制每页最多 20 个商品
-                try:
-                    product = self._parse_product_element_bs4(element)
-                    if product:
-                        products.append(product)
-                except Exception as e:
-                    logger.warning(f"解析商品元素时出错: {e}")
-                    continue
+            response.raise_for_status()
             
-            return products
+            if lxml_html is not None:
+                return self._parse_search_page_lxml(response.content)
+            return self._parse_search_page_bs4(response.content)
             
         except Exception as e:
             logger.error(f"请求搜索页面失败: {e}")
             return []
     
-    def _parse_product_element_selenium(self, element) -> Optional[ProductInfo]:
-        """使用 Selenium 解析商品元素"""
-        try:
-            # 获取标题
-            title_elem = element.find_element(By.CSS_SELECTOR, 'h2 a span')
-            title = title_elem.text.strip() if title_elem else None
-            
-            # 获取链接和 ASIN
-            link_elem = element.find_element(By.CSS_SELECTOR, 'h2 a')
-            product_url = link_elem.get_attribute('href') if link_elem else None
-            asin = self._extract_asin_from_url(product_url) if product_url else None
-            
-            # 获取价格
-            price = None
-            original_price = None
-            try:
-                price_elem = element.find_element(By.CSS_SELECTOR, '.a-price-whole')
-                price_text = price_elem.text.replace(',', '') if price_elem else None
-                if price_text and price_text.isdigit():
-                    price = float(price_text)
-            except:
-                pass
-            
-            # 获取评分
-            rating = None
-            try:
-                rating_elem = element.find_element(By.CSS_SELECTOR, '[aria-label*="stars"]')
-                rating_text = rating_elem.get_attribute('aria-label')
-                if rating_text and 'out of' in rating_text:
-                    rating = float(rating_text.split()[0])
-            except:
-                pass
-            
-            # 获取评论数
-            review_count = None
+    def _parse_search_page_lxml(self, content: bytes) -> List[ProductInfo]:
+        """使用 lxml 和预编译的 XPath 解析搜索结果页"""
+        tree = lxml_html.document_fromstring(content, parser=_html_parser())
+        products = []
+        
+        for element in _XP_RESULTS(tree)[:20]:  # 限制每页最多 20 个商品
             try:
-                review_elem = element.find_element(By.CSS_SELECTOR, 'a[href*="#customerReviews"]')
-                review_text = review_elem.text.replace(',', '')
-                if review_text.isdigit():
-                    review_count = int(review_text)
-            except:
-                pass
-            
-            # 获取图片
-            image_url = None
+                href = _XP_LINK(element)
+                product = self._product_from_card({
+                    'title': _XP_TITLE(element),
+                    'href': 'https://www.amazon.com' + href[0] if href else None,
+                    'price': _XP_PRICE(element),
+                    'rating': next(iter(_XP_RATING(element)), None),
+                    'reviews': _XP_REVIEWS(element),
+                    'img': next(iter(_XP_IMAGE(element)), None)
+                })
+                if product:
+                    products.append(product)
+            except Exception as e:
+                logger.warning(f"解析商品元素时出错: {e}")
+                continue
+        
+        return products
+    
+    def _parse_search_page_bs4(self, content: bytes) -> List[ProductInfo]:
+        """使用 BeautifulSoup 解析搜索结果页（未安装 lxml 时的备用方案）"""
+        from bs4 import BeautifulSoup, SoupStrainer
+        
+        # 只为搜索结果卡片建树，跳过页面其余的脚本、导航和推荐内容
+        strainer = SoupStrainer('div', attrs={'data-component-type': 's-search-result'})
+        soup = BeautifulSoup(content, 'html.parser', from_encoding='utf-8', parse_only=strainer)
+        products = []
+        
+        # 查找商品元素
+        product_elements = soup.find_all('div', {'data-component-type': 's-search-result'})
+        
+        for element in product_elements[:20]:  # 限制每页最多 20 个商品
             try:
-                img_elem = element.find_element(By.CSS_SELECTOR, 'img')
-                image_url = img_elem.get_attribute('src')
-            except:
-                pass
-            
-            if not title:
-                return None
-            
-            return ProductInfo(
-                title=title,
-                price=price,
-                original_price=original_price,
-                rating=rating,
-                review_count=review_count,
-                discount_percentage=None,
-                availability="Unknown",
-                image_url=image_url,
-                product_url=product_url or "",
-                sales_rank=None,
-                category=None,
-                asin=asin
-            )
-            
-        except Exception as e:
-            logger.warning(f"解析商品元素失败: {e}")
+                product = self._parse_product_element_bs4(element)
+                if product:
+                    products.append(product)
+            except Exception as e:
+                logger.warning(f"解析商品元素时出错: {e}")
+                continue
+        
+        return products
+    
+    def _product_from_card(self, card: Dict[str, Any]) -> Optional[ProductInfo]:
+        """根据提取出的商品卡片字段（Selenium、lxml 或 BeautifulSoup）构建商品信息"""
+        title = (card.get('title') or '').strip()
+        if not title:
             return None
+        
+        product_url = card.get('href')
+        asin = self._extract_asin_from_url(product_url)
+        
+        # 获取价格
+        price = None
+        price_text = (card.get('price') or '').translate(_STRIP_NUMBER).rstrip('.')
+        if price_text.isdigit():
+            price = float(price_text)
+        
+        # 获取评分
+        rating = None
+        rating_match = _RATING_RE.search(card.get('rating') or '')
+        if rating_match:
+            rating = float(rating_match.group(1))
+        
+        # 获取评论数
+        review_count = None
+        review_text = (card.get('reviews') or '').translate(_STRIP_NUMBER)
+        if review_text.isdigit():
+            review_count = int(review_text)
+        
+        return ProductInfo(
+            title=title,
+            price=price,
+            original_price=None,
+            rating=rating,
+            review_count=review_count,
+            discount_percentage=None,
+            availability="Unknown",
+            image_url=card.get('img'),
+            product_url=product_url or "",
+            sales_rank=None,
+            category=None,
+            asin=asin
+        )
     
     def _parse_product_element_bs4(self, element) -> Optional[ProductInfo]:
-        """使用 BeautifulSoup 解析商品元素"""
-        try:
-            # 获取标题
-            title_elem = element.find('h2')
-            title = title_elem.get_text().strip() if title_elem else None
-            
-            # 获取链接和 ASIN
-            link_elem = element.find('h2').find('a') if element.find('h2') else None
-            product_url = 'https://www.amazon.com' + link_elem.get('href') if link_elem else None
-            asin = self._extract_asin_from_url(product_url) if product_url else None
-            
-            # 获取价格
-            price = None
-            price_elem = element.find('span', class_='a-price-whole')
-            if price_elem:
-                price_text = price_elem.get_text().replace(',', '')
-                if price_text.isdigit():
-                    price = float(price_text)
-            
-            # 获取评分
-            rating = None
-            rating_elem = element.find('span', {'aria-label': True})
-            if rating_elem and 'out of' in rating_elem.get('aria-label', ''):
-                try:
-                    rating_text = rating_elem.get('aria-label')
-                    rating = float(rating_text.split()[0])
-                except:
-                    pass
-            
-            # 获取评论数
-            review_count = None
-            review_elem = element.find('a', href=lambda x: x and '#customerReviews' in x)
-            if review_elem:
-                review_text = review_elem.get_text().replace(',', '')
-                if review_text.isdigit():
-                    review_count = int(review_text)
-            
-            # 获取图片
-            image_url = None
-            img_elem = element.find('img')
-            if img_elem:
-                image_url = img_elem.get('src')
-            
-            if not title:
-                return None
-            
-            return ProductInfo(
-                title=title,
-                price=price,
-                original_price=None,
-                rating=rating,
-                review_count=review_count,
-                discount_percentage=None,
-                availability="Unknown",
-                image_url=image_url,
-                product_url=product_url or "",
-                sales_rank=None,
-                category=None,
-                asin=asin
-            )
-            
-        except Exception as e:
-            logger.warning(f"解析商品元素失败: {e}")
-            return None
+        """使用 BeautifulSoup 提取商品卡片字段，字段的清洗与 lxml、Selenium 方式共用 _product_from_card"""
+        title_elem = element.find('h2')
+        link_elem = title_elem.find('a') if title_elem else None
+        href = link_elem.get('href') if link_elem else None
+        price_elem = element.find('span', class_='a-price-whole')
+        rating_elem = element.find('span', {'aria-label': True})
+        review_elem = element.find('a', href=lambda x: x and '#customerReviews' in x)
+        img_elem = element.find('img')
+        
+        return self._product_from_card({
+            'title': title_elem.get_text() if title_elem else None,
+            'href': 'https://www.amazon.com' + href if href else None,
+            'price': price_elem.get_text() if price_elem else None,
+            'rating': rating_elem.get('aria-label') if rating_elem else None,
+            'reviews': review_elem.get_text() if review_elem else None,
+            'img': img_elem.get('src') if img_elem else None
+        })
     
     def _extract_asin_from_url(self, url: str) -> Optional[str]:
         """从 URL 中提取 ASIN"""
-        try:
-            import re
-            match = re.search(r'/dp/([A-Z0-9]{10})', url)
-            return match.group(1) if match else None
-        except:
+        if not url:
             return None
+        match = _ASIN_RE.search(url)
+        return match.group(1) if match else None
     
-    def _get_category_id(self, category: str) -> str:
-        """获取类别 ID（简化版本）"""
-        category_mapping = {
-            'Electronics': '172282',
-            'Books': '283155',
-            'Clothing': '7141123011',
-            'Home': '1055398',
-            'Sports': '3375251',
-            'Toys': '165793011'
-        }
-        return category_mapping.get(category, '')
+    def clear_page_cache(self) -> int:
+        """清空单页搜索结果缓存，返回清除的条目数"""
+        return self._pages().clear()
     
     def close(self):
-        """关闭浏览器"""
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
+        """关闭浏览器、抓取线程池和 HTTP 会话"""
+        with self._driver_lock:
+            if self.driver:
+                self.driver.quit()
+                self.driver = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+        with self._page_cache_lock:
+            if self._page_cache is not None:
+                self._page_cache.close()
+                self._page_cache = None
 
 
 class ProductAnalyzer:
     """商品分析器"""
     
-    def analyze_products(self, products: List[ProductInfo]) -> Dict[str, Any]:
+    def analyze_products(self, products: List[ProductInfo], *,
+                         analysis_time: Optional[str] = None) -> Dict[str, Any]:
         """分析商品列表，返回最佳商品
         
         Args:
             products: 商品信息列表
+            analysis_time: 分析时间戳，为 None 时取当前时间
             
         Returns:
             包含分析结果的字典
@@ -450,8 +776,14 @@ class ProductAnalyzer:
                 'analysis_summary': '未找到商品数据'
             }
         
-        # 过滤有效商品
-        valid_products = [p for p in products if p.title and p.price and p.price > 0]
+        # 过滤有效商品，同时提取价格列，后续折扣估算直接复用
+        valid_products = []
+        prices = []
+        for product in products:
+            price = product.price
+            if product.title and price and price > 0:
+                valid_products.append(product)
+                prices.append(price)
         
         if not valid_products:
             return {
@@ -462,14 +794,11 @@ class ProductAnalyzer:
                 'analysis_summary': '未找到有效的商品价格数据'
             }
         
-        # 找到评分最高的商品
-        best_rated = self._find_best_rated(valid_products)
+        # 一次遍历同时找到评分最高和最佳销量（基于评论数）的商品
+        best_rated, best_seller = self._find_best_rated_and_seller(valid_products)
         
         # 找到折扣最大的商品
-        most_discounted = self._find_most_discounted(valid_products)
-        
-        # 找到最佳销量商品（基于评论数）
-        best_seller = self._find_best_seller(valid_products)
+        most_discounted = self._find_most_discounted(valid_products, prices)
         
         return {
             'total_products': len(products),
@@ -478,57 +807,63 @@ class ProductAnalyzer:
             'most_discounted': most_discounted.to_dict() if most_discounted else None,
             'best_seller': best_seller.to_dict() if best_seller else None,
             'analysis_summary': self._generate_summary(best_rated, most_discounted, best_seller),
-            'analysis_time': datetime.now().isoformat()
+            'analysis_time': analysis_time or datetime.now().isoformat()
         }
     
-    def _find_best_rated(self, products: List[ProductInfo]) -> Optional[ProductInfo]:
-        """找到评分最高的商品"""
-        rated_products = [p for p in products if p.rating is not None and p.review_count and p.review_count > 5]
+    def _find_best_rated_and_seller(self, products: List[ProductInfo]) -> Tuple[Optional[ProductInfo], Optional[ProductInfo]]:
+        """单次遍历找到评分最高的商品和最佳销量商品（基于评论数）
         
-        if not rated_products:
-            return None
+        每个商品的评分和评论数只读取一次；并列时与 max() 一样保留最先出现的商品。
+        """
+        best_rated = None
+        best_score = None
+        best_seller = None
+        best_reviews = 0
         
-        # 综合评分和评论数量来判断最佳评分商品
-        def rating_score(product):
-            return product.rating * min(1.0, product.review_count / 100) * 100
+        for product in products:
+            review_count = product.review_count
+            if not review_count or review_count <= 0:
+                continue
+            
+            if review_count > best_reviews:
+                best_seller = product
+                best_reviews = review_count
+            
+            rating = product.rating
+            if rating is not None and review_count > 5:
+                # 综合评分和评论数量来判断最佳评分商品
+                score = rating * min(1.0, review_count / 100) * 100
+                if best_score is None or score > best_score:
+                    best_rated = product
+                    best_score = score
         
-        return max(rated_products, key=rating_score)
+        return best_rated, best_seller
     
-    def _find_most_discounted(self, products: List[ProductInfo]) -> Optional[ProductInfo]:
-        """找到折扣最大的商品（基于价格范围估算）"""
+    def _find_most_discounted(self, products: List[ProductInfo], prices: List[float]) -> Optional[ProductInfo]:
+        """找到折扣最大的商品（基于价格范围估算）
+        
+        prices 与 products 一一对应，为各商品的有效价格。
+        """
         # 由于 Amazon 搜索页面通常不显示原价，我们基于价格分布来估算折扣
         if len(products) < 3:
             return None
         
         # 计算价格中位数作为基准
-        prices = [p.price for p in products if p.price]
-        if not prices:
-            return None
+        median_price = statistics.median_high(prices)
+        threshold = median_price * 0.7  # 价格低于中位数 70%
         
-        prices.sort()
-        median_price = prices[len(prices) // 2]
-        
-        # 找到价格明显低于中位数的商品（可能是折扣商品）
-        discounted_products = []
-        for product in products:
-            if product.price and product.price < median_price * 0.7:  # 价格低于中位数 70%
-                discount_estimate = (median_price - product.price) / median_price * 100
-                product.discount_percentage = discount_estimate
-                discounted_products.append(product)
-        
-        if not discounted_products:
-            return None
-        
-        return max(discounted_products, key=lambda p: p.discount_percentage or 0)
-    
-    def _find_best_seller(self, products: List[ProductInfo]) -> Optional[ProductInfo]:
-        """找到最佳销量商品（基于评论数）"""
-        products_with_reviews = [p for p in products if p.review_count and p.review_count > 0]
-        
-        if not products_with_reviews:
+        # 估算折扣随价格递减，折扣最大者即价格最低者（并列时取最先出现的商品）；
+        # 只有它明显低于中位数时才视为折扣商品，无需为其余商品逐个计算折扣
+        cheapest = min(range(len(prices)), key=prices.__getitem__)
+        lowest_price = prices[cheapest]
+        if lowest_price >= threshold:
             return None
         
-        return max(products_with_reviews, key=lambda p: p.review_count)
+        # 返回带估算折扣的副本，不修改调用方（及搜索缓存）中的商品对象
+        return replace(
+            products[cheapest],
+            discount_percentage=(median_price - lowest_price) / median_price * 100
+        )
     
     def _generate_summary(self, best_rated: Optional[ProductInfo], 
                          most_discounted: Optional[ProductInfo], 
@@ -551,6 +886,72 @@ class ProductAnalyzer:
         return "\n\n".join(summary_parts)
 
 
+# HTML 报告的固定部分：头部样式表、摘要、商品卡片和页脚
+_REPORT_HEAD = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Amazon 商品监控报告</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }
+        .container { max-width: 800px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        .header { background-color: #232f3e; color: white; padding: 20px; text-align: center; border-radius: 5px; margin-bottom: 20px; }
+        .product-card { border: 1px solid #ddd; border-radius: 8px; padding: 15px; margin: 15px 0; background-color: #fafafa; }
+        .product-title { font-size: 16px; font-weight: bold; color: #0066c0; margin-bottom: 10px; }
+        .product-price { font-size: 18px; color: #B12704; font-weight: bold; }
+        .product-rating { color: #ff9900; }
+        .section-title { font-size: 20px; color: #232f3e; border-bottom: 2px solid #ff9900; padding-bottom: 5px; margin: 20px 0 10px 0; }
+        .summary { background-color: #e8f4fd; padding: 15px; border-radius: 5px; margin: 15px 0; }
+        .footer { text-align: center; color: #666; font-size: 12px; margin-top: 30px; }
+        .no-data { color: #666; font-style: italic; }
+    </style>
+</head>
+<body>
+    <div class="container">"""
+
+_REPORT_HEADER_TMPL = Template("""
+        <div class="header">
+            <h1>🛍️ Amazon 商品监控报告</h1>
+            <p>搜索关键词: <strong>$keyword</strong></p>
+            <p>报告时间: $analysis_time</p>
+        </div>
+        
+        <div class="summary">
+            <h2>📊 分析摘要</h2>
+            <p><strong>总商品数:</strong> $total_products</p>
+            <p><strong>有效商品数:</strong> $valid_products</p>
+            <p>$analysis_summary</p>
+        </div>
+        """)
+
+_PRODUCT_CARD_TMPL = Template("""
+        <div class="product-card">
+            <div class="product-title">$icon $title</div>
+            <p><span class="product-price">$price_text</span> $discount_text</p>
+            <p><span class="product-rating">★ $rating_text</span> $review_text</p>
+            <p><a href="$url" target="_blank">查看商品详情</a></p>
+        </div>
+        """)
+
+_REPORT_FOOTER_TMPL = Template("""
+        <div class="footer">
+            <p>此报告由 Amazon 商品监控系统自动生成</p>
+            <p>数据来源: Amazon.com | 生成时间: $generated_at</p>
+        </div>
+    </div>
+</body>
+</html>
+        """)
+
+# 报告中的商品段落：(分析结果键, 图标, 标题, 无数据提示)
+_REPORT_SECTIONS = (
+    ('best_rated', '⭐', '最佳评分商品', '未找到评分数据'),
+    ('most_discounted', '💰', '最高折扣商品', '未找到折扣商品'),
+    ('best_seller', '🔥', '最佳销量商品', '未找到销量数据')
+)
+
+
 class EmailReporter:
     """邮件报告发送器"""
     
@@ -573,107 +974,101 @@ class EmailReporter:
         Returns:
             发送是否成功
         """
-        try:
-            # 生成邮件内容
-            subject = f"Amazon 商品监控报告 - {keyword}"
-            html_content = self._generate_html_report(analysis_result, keyword)
-            
-            # 创建邮件
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = sender_email
-            msg['To'] = recipient_email
-            
-            # 添加 HTML 内容
-            html_part = MIMEText(html_content, 'html', 'utf-8')
-            msg.attach(html_part)
+        report = {
+            'analysis_result': analysis_result,
+            'recipient_email': recipient_email,
+            'keyword': keyword
+        }
+        return self.send_reports([report], sender_email, sender_password)[0]
+    
+    def send_reports(self, reports: List[Dict[str, Any]], 
+                    sender_email: str, sender_password: str) -> List[bool]:
+        """通过同一个 SMTP 连接批量发送分析报告邮件
+        
+        只进行一次 TLS 握手和登录；单封邮件发送失败不影响其余邮件。
+        
+        Args:
+            reports: 报告列表，每项包含 analysis_result、recipient_email 和 keyword
+            sender_email: 发送者邮箱
+            sender_password: 发送者邮箱密码或应用密码
             
-            # 发送邮件
+        Returns:
+            与 reports 一一对应的发送结果
+        """
+        results = [False] * len(reports)
+        if not reports:
+            return results
+        
+        import smtplib
+        
+        try:
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
                 server.starttls()
                 server.login(sender_email, sender_password)
-                server.send_message(msg)
-            
-            logger.info(f"邮件发送成功: {recipient_email}")
-            return True
+                
+                for i, report in enumerate(reports):
+                    recipient_email = report['recipient_email']
+                    try:
+                        msg = self._build_message(report['analysis_result'], recipient_email,
+                                                  sender_email, report['keyword'])
+                        server.send_message(msg)
+                        results[i] = True
+                        logger.info(f"邮件发送成功: {recipient_email}")
+                    except Exception as e:
+                        logger.error(f"邮件发送失败: {recipient_email}: {e}")
             
         except Exception as e:
             logger.error(f"邮件发送失败: {e}")
-            return False
+        
+        return results
     
-    def _generate_html_report(self, analysis_result: Dict[str, Any], keyword: str) -> str:
-        """生成 HTML 格式的报告"""
-        html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Amazon 商品监控报告</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f5f5f5; }}
-        .container {{ max-width: 800px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-        .header {{ background-color: #232f3e; color: white; padding: 20px; text-align: center; border-radius: 5px; margin-bottom: 20px; }}
-        .product-card {{ border: 1px solid #ddd; border-radius: 8px; padding: 15px; margin: 15px 0; background-color: #fafafa; }}
-        .product-title {{ font-size: 16px; font-weight: bold; color: #0066c0; margin-bottom: 10px; }}
-        .product-price {{ font-size: 18px; color: #B12704; font-weight: bold; }}
-        .product-rating {{ color: #ff9900; }}
-        .section-title {{ font-size: 20px; color: #232f3e; border-bottom: 2px solid #ff9900; padding-bottom: 5px; margin: 20px 0 10px 0; }}
-        .summary {{ background-color: #e8f4fd; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-        .footer {{ text-align: center; color: #666; font-size: 12px; margin-top: 30px; }}
-        .no-data {{ color: #666; font-style: italic; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🛍️ Amazon 商品监控报告</h1>
-            <p>搜索关键词: <strong>{keyword}</strong></p>
-            <p>报告时间: {analysis_result.get('analysis_time', '未知')}</p>
-        </div>
+    def _build_message(self, analysis_result: Dict[str, Any], recipient_email: str,
+                      sender_email: str, keyword: str) -> "MIMEMultipart":
+        """创建报告邮件"""
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
         
-        <div class="summary">
-            <h2>📊 分析摘要</h2>
-            <p><strong>总商品数:</strong> {analysis_result.get('total_products', 0)}</p>
-            <p><strong>有效商品数:</strong> {analysis_result.get('valid_products', 0)}</p>
-            <p>{analysis_result.get('analysis_summary', '无分析数据')}</p>
-        </div>
-        """
+        # 生成邮件内容
+        subject = f"Amazon 商品监控报告 - {keyword}"
+        html_content = self._generate_html_report(analysis_result, keyword)
         
-        # 最佳评分商品
-        best_rated = analysis_result.get('best_rated')
-        html += '<div class="section-title">⭐ 最佳评分商品</div>'
-        if best_rated:
-            html += self._format_product_card(best_rated, "⭐")
-        else:
-            html += '<p class="no-data">未找到评分数据</p>'
+        # 创建邮件
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = sender_email
+        msg['To'] = recipient_email
         
-        # 最高折扣商品
-        most_discounted = analysis_result.get('most_discounted')
-        html += '<div class="section-title">💰 最高折扣商品</div>'
-        if most_discounted:
-            html += self._format_product_card(most_discounted, "💰")
-        else:
-            html += '<p class="no-data">未找到折扣商品</p>'
+        # 添加 HTML 内容
+        html_part = MIMEText(html_content, 'html', 'utf-8')
+        msg.attach(html_part)
         
-        # 最佳销量商品
-        best_seller = analysis_result.get('best_seller')
-        html += '<div class="section-title">🔥 最佳销量商品</div>'
-        if best_seller:
-            html += self._format_product_card(best_seller, "🔥")
-        else:
-            html += '<p class="no-data">未找到销量数据</p>'
+        return msg
+    
+    def _generate_html_report(self, analysis_result: Dict[str, Any], keyword: str) -> str:
+        """生成 HTML 格式的报告"""
+        # 各段落先收集到列表中，最后一次性拼接
+        parts = [_REPORT_HEAD, _REPORT_HEADER_TMPL.substitute(
+            keyword=escape(keyword),
+            analysis_time=escape(str(analysis_result.get('analysis_time', '未知'))),
+            total_products=analysis_result.get('total_products', 0),
+            valid_products=analysis_result.get('valid_products', 0),
+            analysis_summary=escape(str(analysis_result.get('analysis_summary', '无分析数据')))
+        )]
         
-        html += """
-        <div class="footer">
-            <p>此报告由 Amazon 商品监控系统自动生成</p>
-            <p>数据来源: Amazon.com | 生成时间: {}</p>
-        </div>
-    </div>
-</body>
-</html>
-        """.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        # 最佳评分、最高折扣、最佳销量商品
+        for key, icon, section_title, empty_text in _REPORT_SECTIONS:
+            parts.append(f'<div class="section-title">{icon} {section_title}</div>')
+            product = analysis_result.get(key)
+            if product:
+                parts.append(self._format_product_card(product, icon))
+            else:
+                parts.append(f'<p class="no-data">{empty_text}</p>')
+        
+        parts.append(_REPORT_FOOTER_TMPL.substitute(
+            generated_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
         
-        return html
+        return "".join(parts)
     
     def _format_product_card(self, product: Dict[str, Any], icon: str) -> str:
         """格式化商品卡片"""
@@ -684,19 +1079,95 @@ class EmailReporter:
         discount = product.get('discount_percentage')
         url = add_affiliate_id_to_url(product.get('product_url', '#'))  # 添加联盟 ID
         
-        price_text = f"${price:.2f}" if price else "价格未知"
-        rating_text = f"{rating}/5.0" if rating else "无评分"
-        review_text = f"({review_count} 评论)" if review_count else "(无评论)"
-        discount_text = f"折扣: {discount:.1f}%" if discount else ""
+        return _PRODUCT_CARD_TMPL.substitute(
+            icon=icon,
+            title=escape(title),
+            price_text=f"${price:.2f}" if price else "价格未知",
+            discount_text=f"折扣: {discount:.1f}%" if discount else "",
+            rating_text=f"{rating}/5.0" if rating else "无评分",
+            review_text=f"({review_count} 评论)" if review_count else "(无评论)",
+            url=escape(url)
+        )
+
+
+def _execute_monitor(monitor: Dict[str, Any], scraper: AmazonScraper, analyzer: ProductAnalyzer,
+                     reporter: EmailReporter, sender_email: str = "",
+                     sender_password: str = "") -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """执行一次监控：搜索、分析并按需发送邮件
+    
+    Returns:
+        (运行结果, 历史记录条目)
+    """
+    monitor_id = monitor['id']
+    try:
+        # 搜索商品
+        logger.info(f"开始搜索商品: {monitor['keyword']}")
+        products = scraper.search_products(monitor['keyword'], monitor['category'])
+        
+        # 分析商品
+        logger.info(f"开始分析 {len(products)} 个商品")
+        analysis_result = analyzer.analyze_products(products)
         
-        return f"""
-        <div class="product-card">
-            <div class="product-title">{icon} {title}</div>
-            <p><span class="product-price">{price_text}</span> {discount_text}</p>
-            <p><span class="product-rating">★ {rating_text}</span> {review_text}</p>
-            <p><a href="{url}" target="_blank">查看商品详情</a></p>
-        </div>
-        """
+        # 记录历史
+        history_entry = {
+            'monitor_id': monitor_id,
+            'keyword': monitor['keyword'],
+            'timestamp': datetime.now().isoformat(),
+            'analysis_result': analysis_result,
+            'success': True
+        }
+        
+        # 发送邮件（如果配置了邮箱）
+        email_sent = False
+        if monitor['email'] and sender_email and sender_password:
+            logger.info(f"发送邮件报告到: {monitor['email']}")
+            email_sent = reporter.send_report(
+                analysis_result, monitor['email'], 
+                sender_email, sender_password, monitor['keyword']
+            )
+        
+        return {
+            'success': True,
+            'monitor_id': monitor_id,
+            'keyword': monitor['keyword'],
+            'products_found': len(products),
+            'analysis_result': analysis_result,
+            'email_sent': email_sent
+        }, history_entry
+        
+    except Exception as e:
+        logger.error(f"运行监控失败: {e}")
+        return {'success': False, 'monitor_id': monitor_id, 'error': str(e)}, _failed_history_entry(monitor, e)
+
+
+def _failed_history_entry(monitor: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+    """构建失败的历史记录条目"""
+    return {
+        'monitor_id': monitor['id'],
+        'keyword': monitor['keyword'],
+        'timestamp': datetime.now().isoformat(),
+        'error': str(error),
+        'success': False
+    }
+
+
+def _init_monitor_worker(worker_count: int):
+    """子进程初始化：按进程数分摊限速，使所有工作进程合计不超过配置的请求速率和并发数"""
+    global _REQUEST_BUCKET, _REQUEST_SLOTS
+    _REQUEST_BUCKET = _TokenBucket(rate=REQUEST_RATE / worker_count,
+                                   capacity=max(1, REQUEST_BURST // worker_count))
+    _REQUEST_SLOTS = threading.BoundedSemaphore(max(1, MAX_CONCURRENCY // worker_count))
+
+
+def _run_monitor_worker(monitor: Dict[str, Any], sender_email: str,
+                        sender_password: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """子进程入口：使用独立的抓取器执行一次监控"""
+    scraper = AmazonScraper()
+    try:
+        return _execute_monitor(monitor, scraper, ProductAnalyzer(), EmailReporter(),
+                                sender_email, sender_password)
+    finally:
+        scraper.close()
 
 
 class ProductMonitor:
@@ -704,33 +1175,123 @@ class ProductMonitor:
     
     def __init__(self, data_file: str = "product_monitor_data.json"):
         self.data_file = Path(data_file)
+        # 运行历史单独追加写入 JSONL 文件，每次运行无需重写全部数据
+        self.history_file = self.data_file.with_name(f"{self.data_file.stem}_history.jsonl")
         self.scraper = AmazonScraper()
         self.analyzer = ProductAnalyzer()
         self.reporter = EmailReporter()
+        # 多个工具调用可能在不同线程中同时修改监控数据
+        self._lock = threading.RLock()
+        # 内存中的 self.data 为准，修改后延迟合并写盘
+        self._dirty = False
+        self._last_flush = float('-inf')
+        self._flush_timer = None
+        # 运行历史的追加写入句柄，首次写入时打开并保持打开
+        self._history_fp = None
+        # 监控摘要缓存，监控数据修改时失效
+        self._summaries = None
         self.data = self._load_data()
+        # 按 ID 索引监控（与 data['monitors'] 中的字典为同一对象），查找无需遍历列表
+        self._by_id = {m['id']: m for m in self.data['monitors']}
+        # 进程退出时写入尚未落盘的修改
+        atexit.register(self._flush)
     
     def _load_data(self) -> Dict[str, Any]:
         """加载监控数据"""
         if self.data_file.exists():
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                data = json_loads(self.data_file.read_bytes())
+                
+                # 迁移旧版数据文件中内嵌的历史记录
+                history = data.pop('history', None)
+                if history:
+                    with self._lock:
+                        for entry in history:
+                            self._append_history(entry)
+                    self.data = data
+                    self._save_data()
+                    logger.info(f"已将 {len(history)} 条历史记录迁移到 {self.history_file}")
+                
+                return data
             except Exception as e:
                 logger.error(f"加载数据文件失败: {e}")
         
         return {
             'monitors': [],
-            'history': [],
             'settings': {}
         }
     
+    def _append_history(self, entry: Dict[str, Any]):
+        """追加一条运行历史"""
+        with self._lock:
+            if self._history_fp is None:
+                self._history_fp = open(self.history_file, 'ab')
+            self._history_fp.write(json_dumps_bytes(entry) + b'\n')
+            self._history_fp.flush()
+    
+    def _iter_history(self):
+        """逐行读取运行历史"""
+        if not self.history_file.exists():
+            return
+        
+        with open(self.history_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield json_loads(line)
+    
+    def _iter_history_lines_reversed(self, block_size: int = 1 << 16):
+        """从文件末尾按块向前读取，倒序逐行返回运行历史的原始 JSON 行"""
+        if not self.history_file.exists():
+            return
+        
+        with open(self.history_file, 'rb') as f:
+            position = f.seek(0, os.SEEK_END)
+            remainder = b''
+            while position > 0:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                lines = (f.read(read_size) + remainder).split(b'\n')
+                # 块首的行可能不完整，留到读取前一块时拼接
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line
+            if remainder.strip():
+                yield remainder
+    
     def _save_data(self):
-        """保存监控数据"""
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存数据文件失败: {e}")
+        """保存监控数据（不含运行历史）
+        
+        距上次写盘超过 SAVE_DEBOUNCE_SECONDS 时立即写入，否则合并到稍后的一次写入中。
+        """
+        with self._lock:
+            self._dirty = True
+            self._summaries = None
+            delay = self._last_flush + SAVE_DEBOUNCE_SECONDS - time.monotonic()
+            if delay <= 0:
+                self._flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(delay, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _flush(self):
+        """将尚未落盘的监控数据写入文件"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            if not self._dirty:
+                return
+            
+            try:
+                self.data_file.write_bytes(json_dumps_bytes(self.data, indent=True))
+                self._dirty = False
+                self._last_flush = time.monotonic()
+            except Exception as e:
+                logger.error(f"保存数据文件失败: {e}")
     
     def add_monitor(self, keyword: str, category: str = "All", 
                    email: str = "", frequency: str = "daily") -> str:
@@ -740,26 +1301,37 @@ class ProductMonitor:
             keyword: 搜索关键词
             category: 商品类别
             email: 通知邮箱
-            frequency: 监控频率 (daily, weekly, monthly)
+            frequency: 监控频率 (hourly, daily, weekly, monthly)
             
         Returns:
             监控 ID
         """
-        monitor_id = f"monitor_{len(self.data['monitors']) + 1}_{int(datetime.now().timestamp())}"
-        
-        monitor = {
-            'id': monitor_id,
-            'keyword': keyword,
-            'category': category,
-            'email': email,
-            'frequency': frequency,
-            'created_at': datetime.now().isoformat(),
-            'last_run': None,
-            'active': True
-        }
-        
-        self.data['monitors'].append(monitor)
-        self._save_data()
+        with self._lock:
+            # 序号保存在 settings 中且只增不减，删除监控后也不会复用其 ID（历史记录按 ID 关联）；
+            # 旧版数据文件没有该计数器，从现有监控数开始并跳过已被占用的 ID
+            settings = self.data.setdefault('settings', {})
+            sequence = settings.get('next_monitor_sequence', len(self.data['monitors']) + 1)
+            timestamp = int(datetime.now().timestamp())
+            monitor_id = f"monitor_{sequence}_{timestamp}"
+            while monitor_id in self._by_id:
+                sequence += 1
+                monitor_id = f"monitor_{sequence}_{timestamp}"
+            settings['next_monitor_sequence'] = sequence + 1
+            
+            monitor = {
+                'id': monitor_id,
+                'keyword': keyword,
+                'category': category,
+                'email': email,
+                'frequency': frequency,
+                'created_at': datetime.now().isoformat(),
+                'last_run': None,
+                'active': True
+            }
+            
+            self.data['monitors'].append(monitor)
+            self._by_id[monitor_id] = monitor
+            self._save_data()
         
         logger.info(f"添加监控: {keyword} (ID: {monitor_id})")
         return monitor_id
@@ -776,98 +1348,166 @@ class ProductMonitor:
         Returns:
             运行结果
         """
-        # 查找监控
-        monitor = None
-        for m in self.data['monitors']:
-            if m['id'] == monitor_id:
-                monitor = m
-                break
+        with self._lock:
+            monitor = self._by_id.get(monitor_id)
         
         if not monitor:
-            return {'success': False, 'error': '监控不存在'}
+            return {'success': False, 'monitor_id': monitor_id, 'error': '监控不存在'}
         
         if not monitor['active']:
-            return {'success': False, 'error': '监控已禁用'}
+            return {'success': False, 'monitor_id': monitor_id, 'error': '监控已禁用'}
         
-        try:
-            # 搜索商品
-            logger.info(f"开始搜索商品: {monitor['keyword']}")
-            products = self.scraper.search_products(monitor['keyword'], monitor['category'])
-            
-            # 分析商品
-            logger.info(f"开始分析 {len(products)} 个商品")
-            analysis_result = self.analyzer.analyze_products(products)
-            
-            # 记录历史
-            history_entry = {
-                'monitor_id': monitor_id,
-                'keyword': monitor['keyword'],
-                'timestamp': datetime.now().isoformat(),
-                'analysis_result': analysis_result,
-                'success': True
-            }
-            self.data['history'].append(history_entry)
-            
-            # 发送邮件（如果配置了邮箱）
-            email_sent = False
-            if monitor['email'] and sender_email and sender_password:
-                logger.info(f"发送邮件报告到: {monitor['email']}")
-                email_sent = self.reporter.send_report(
-                    analysis_result, monitor['email'], 
-                    sender_email, sender_password, monitor['keyword']
-                )
-            
-            # 更新监控状态
-            monitor['last_run'] = datetime.now().isoformat()
-            self._save_data()
-            
-            return {
-                'success': True,
-                'monitor_id': monitor_id,
-                'keyword': monitor['keyword'],
-                'products_found': len(products),
-                'analysis_result': analysis_result,
-                'email_sent': email_sent
-            }
+        result, history_entry = _execute_monitor(
+            monitor, self.scraper, self.analyzer, self.reporter, sender_email, sender_password
+        )
+        self._record_run(monitor, history_entry)
+        return result
+    
+    def run_all_active(self, sender_email: str = "", sender_password: str = "",
+                       max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """在多个进程中并行运行所有启用的监控
+        
+        每个子进程使用独立的浏览器和 HTTP 会话，只负责抓取、分析和发送邮件；
+        运行结果由当前进程统一记录，避免多个进程同时写数据文件。
+        子进程以 spawn 方式启动（当前进程中有多个线程，fork 可能死锁），
+        进程数不超过 MAX_CONCURRENCY，请求速率和并发数在各子进程之间平均分摊。
+        
+        Args:
+            sender_email: 发送者邮箱
+            sender_password: 发送者邮箱密码
+            max_workers: 最大进程数，默认为 CPU 核数的一半
             
-        except Exception as e:
-            logger.error(f"运行监控失败: {e}")
-            
-            # 记录失败历史
-            history_entry = {
-                'monitor_id': monitor_id,
-                'keyword': monitor['keyword'],
-                'timestamp': datetime.now().isoformat(),
-                'error': str(e),
-                'success': False
-            }
-            self.data['history'].append(history_entry)
-            self._save_data()
+        Returns:
+            与启用的监控一一对应的运行结果
+        """
+        monitors = [m for m in self.get_monitors() if m['active']]
+        if not monitors:
+            return []
+        
+        worker_count = max(1, min(max_workers or (os.cpu_count() or 2) // 2, MAX_CONCURRENCY, len(monitors)))
+        
+        results = []
+        with ProcessPoolExecutor(max_workers=worker_count,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_monitor_worker,
+                                 initargs=(worker_count,)) as executor:
+            futures = [
+                executor.submit(_run_monitor_worker, monitor, sender_email, sender_password)
+                for monitor in monitors
+            ]
             
-            return {'success': False, 'error': str(e)}
+            for monitor, future in zip(monitors, futures):
+                try:
+                    result, history_entry = future.result()
+                except Exception as e:
+                    logger.error(f"运行监控失败: {e}")
+                    result = {'success': False, 'monitor_id': monitor['id'], 'error': str(e)}
+                    history_entry = _failed_history_entry(monitor, e)
+                
+                self._record_run(monitor, history_entry)
+                results.append(result)
+        
+        return results
+    
+    def _record_run(self, monitor: Dict[str, Any], history_entry: Dict[str, Any]):
+        """记录一次监控运行：追加历史，成功时更新上次运行时间"""
+        with self._lock:
+            self._append_history(history_entry)
+            if history_entry['success']:
+                monitor['last_run'] = datetime.now().isoformat()
+                self._save_data()
     
     def get_monitors(self) -> List[Dict[str, Any]]:
         """获取所有监控"""
-        return self.data['monitors']
+        with self._lock:
+            return list(self.data['monitors'])
     
-    def get_monitor_history(self, monitor_id: str = "") -> List[Dict[str, Any]]:
-        """获取监控历史"""
-        if monitor_id:
-            return [h for h in self.data['history'] if h.get('monitor_id') == monitor_id]
-        return self.data['history']
+    def get_monitor_summaries(self) -> List[Dict[str, Any]]:
+        """获取所有监控的摘要（只含 MONITOR_SUMMARY_FIELDS 中的字段）
+        
+        摘要在监控数据下次修改前缓存复用，重复列出监控时无需逐个重建；
+        每次返回浅拷贝，调用方修改返回的摘要不会影响缓存。
+        """
+        with self._lock:
+            if self._summaries is None:
+                self._summaries = [
+                    {key: m.get(key) for key in MONITOR_SUMMARY_FIELDS}
+                    for m in self.data['monitors']
+                ]
+            return [dict(summary) for summary in self._summaries]
+    
+    def is_due(self, monitor: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        """判断监控是否到了下一次运行时间"""
+        if not monitor.get('active'):
+            return False
+        
+        last_run = monitor.get('last_run')
+        if not last_run:
+            return True
+        
+        interval = FREQUENCY_INTERVALS.get(monitor.get('frequency'), FREQUENCY_INTERVALS['daily'])
+        return (now or datetime.now()) - datetime.fromisoformat(last_run) >= interval
+    
+    def get_due_monitors(self) -> List[Dict[str, Any]]:
+        """获取所有到期需要运行的监控"""
+        now = datetime.now()
+        return [m for m in self.get_monitors() if self.is_due(m, now)]
+    
+    def get_monitor_history(self, monitor_id: str = "", limit: int = 0) -> List[Dict[str, Any]]:
+        """获取监控历史
+        
+        Args:
+            monitor_id: 监控 ID，为空时返回所有监控的历史
+            limit: 只返回最近的若干条记录（按时间顺序），0 表示不限制
+        """
+        with self._lock:
+            if limit <= 0:
+                if monitor_id:
+                    return [h for h in self._iter_history() if h.get('monitor_id') == monitor_id]
+                return list(self._iter_history())
+            
+            # 从文件末尾倒序查找，凑够条数即停止，不必解析更早的记录；
+            # 不含该 ID 字节串的行直接跳过，无需解析
+            needle = monitor_id.encode('utf-8')
+            recent = []
+            for line in self._iter_history_lines_reversed():
+                if needle not in line:
+                    continue
+                entry = json_loads(line)
+                if monitor_id and entry.get('monitor_id') != monitor_id:
+                    continue
+                recent.append(entry)
+                if len(recent) >= limit:
+                    break
+            
+            recent.reverse()
+            return recent
     
     def remove_monitor(self, monitor_id: str) -> bool:
         """删除监控"""
-        original_length = len(self.data['monitors'])
-        self.data['monitors'] = [m for m in self.data['monitors'] if m['id'] != monitor_id]
-        
-        if len(self.data['monitors']) < original_length:
+        with self._lock:
+            monitor = self._by_id.pop(monitor_id, None)
+            if monitor is None:
+                return False
+            
+            # 按对象身份原地删除对应条目，无需重建整个列表
+            monitors = self.data['monitors']
+            for i, m in enumerate(monitors):
+                if m is monitor:
+                    del monitors[i]
+                    break
             self._save_data()
-            logger.info(f"删除监控: {monitor_id}")
-            return True
         
-        return False
+        logger.info(f"删除监控: {monitor_id}")
+        return True
     
     def close(self):
         """清理资源"""
+        self._flush()
+        # 已写入剩余修改，取消退出时的写盘回调，释放 atexit 对本实例的引用
+        atexit.unregister(self._flush)
+        with self._lock:
+            if self._history_fp is not None:
+                self._history_fp.close()
+                self._history_fp = None
         self.scraper.close()
@@ -4,6 +4,7 @@
 """
 
 import json
+from pathlib import Path
 from src.amazon_monitor.tools import add_affiliate_id_to_url
 
 # 测试联盟 URL 生成
@@ -62,7 +63,8 @@ def create_sample_markdown_report():
     from datetime import datetime
     keyword = "蓝牙耳机"
     
-    markdown = f"""# 🛒 Amazon 商品监控报告
+    # 各段落先收集到列表中，最后一次性拼接
+    parts = [f"""# 🛒 Amazon 商品监控报告
 
 ## 📊 搜索信息
 - **关键词**: {keyword}
@@ -75,49 +77,60 @@ def create_sample_markdown_report():
 
 ---
 
-"""
+"""]
     
-    # 最佳评分商品
+    # 最佳评分商品：各字段只查找一次，绑定到局部变量后再格式化
     best_rated = sample_analysis.get('best_rated')
-    markdown += "## ⭐ 最佳评分商品\n\n"
+    parts.append("## ⭐ 最佳评分商品\n\n")
     if best_rated:
+        title = best_rated.get('title', '未知商品')
+        price = best_rated.get('price', 0)
+        rating = best_rated.get('rating', 'N/A')
+        reviews = best_rated.get('review_count', 0)
         affiliate_url = add_affiliate_id_to_url(best_rated.get('product_url', '#'))
-        markdown += f"""### {best_rated.get('title', '未知商品')}
-- **价格**: ${best_rated.get('price', 0):.2f}
-- **评分**: {best_rated.get('rating', 'N/A')}/5.0
-- **评论数**: {best_rated.get('review_count', 0)}
+        parts.append(f"""### {title}
+- **价格**: ${price:.2f}
+- **评分**: {rating}/5.0
+- **评论数**: {reviews}
 - **🎯 联盟链接**: [查看商品 (含联盟 ID)]({affiliate_url})
 
-"""
+""")
     
     # 最高折扣商品
     most_discounted = sample_analysis.get('most_discounted')
-    markdown += "## 💰 最高折扣商品\n\n"
+    parts.append("## 💰 最高折扣商品\n\n")
     if most_discounted:
+        title = most_discounted.get('title', '未知商品')
+        price = most_discounted.get('price', 0)
         discount = most_discounted.get('discount_percentage', 0)
+        rating = most_discounted.get('rating', 'N/A')
         affiliate_url = add_affiliate_id_to_url(most_discounted.get('product_url', '#'))
-        markdown += f"""### {most_discounted.get('title', '未知商品')}
-- **价格**: ${most_discounted.get('price', 0):.2f}
+        parts.append(f"""### {title}
+- **价格**: ${price:.2f}
 - **估计折扣**: {discount:.1f}%
-- **评分**: {most_discounted.get('rating', 'N/A')}/5.0
+- **评分**: {rating}/5.0
 - **🎯 联盟链接**: [查看商品 (含联盟 ID)]({affiliate_url})
 
-"""
+""")
     
     # 最佳销量商品
     best_seller = sample_analysis.get('best_seller')
-    markdown += "## 🔥 最佳销量商品\n\n"
+    parts.append("## 🔥 最佳销量商品\n\n")
     if best_seller:
+        title = best_seller.get('title', '未知商品')
+        price = best_seller.get('price', 0)
+        reviews = best_seller.get('review_count', 0)
+        rating = best_seller.get('rating', 'N/A')
         affiliate_url = add_affiliate_id_to_url(best_seller.get('product_url', '#'))
-        markdown += f"""### {best_seller.get('title', '未知商品')}
-- **价格**: ${best_seller.get('price', 0):.2f}
-- **评论数**: {best_seller.get('review_count', 0)}
-- **评分**: {best_seller.get('rating', 'N/A')}/5.0
+        parts.append(f"""### {title}
+- **价格**: ${price:.2f}
+- **评论数**: {reviews}
+- **评分**: {rating}/5.0
 - **🎯 联盟链接**: [查看商品 (含联盟 ID)]({affiliate_url})
 
-"""
+""")
     
-    markdown += """---
+    parts.append("""---
 
 ## 🎯 Amazon 联盟信息
 - **联盟 ID**: `joweaipmclub-20`
@@ -125,11 +138,12 @@ def create_sample_markdown_report():
 - **收益来源**: 通过报告链接产生的购买行为将被追踪
 
 *此报告由 Amazon 商品监控系统自动生成*
-"""
+""")
+    
+    markdown = "".join(parts)
     
-    # 保存报告
-    with open('/workspace/amazon-product-monitor-mcp/sample_affiliate_report.md', 'w', encoding='utf-8') as f:
-        f.write(markdown)
+    # 保存报告：一次编码为 UTF-8，再以二进制方式整体写入
+    Path('/workspace/amazon-product-monitor-mcp/sample_affiliate_report.md').write_bytes(markdown.encode('utf-8'))
     
     print("✅ 示例 Markdown 报告已生成: sample_affiliate_report.md")
     print("\n📋 报告预览 (前 20 行):")
@@ -7,27 +7,52 @@ Amazon Product Monitor MCP Server 测试文件
 
 import asyncio
 import json
+import math
 import pytest
 import tempfile
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import patch, MagicMock
+from diskcache import Cache
 from fastmcp import Client
 import sys
 
 # 添加项目根目录到 Python 路径
 sys.path.append(str(Path(__file__).parent.parent))
 
+import server
 from server import mcp
-from src.amazon_monitor.tools import ProductInfo, ProductAnalyzer, ProductMonitor
+from src.amazon_monitor.tools import (
+    ProductInfo, ProductAnalyzer, ProductMonitor, AmazonScraper, EmailReporter, add_affiliate_id_to_url,
+    json_loads, MAX_CONCURRENCY, _env_number
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """将磁盘缓存目录指向临时目录，测试不写入用户的 ~/.cache，也不受之前运行遗留的缓存影响"""
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setattr('src.amazon_monitor.tools.CACHE_DIR', cache_dir)
+    monkeypatch.setattr(server, 'CACHE_DIR', cache_dir)
+    # 以 spawn 启动的监控子进程从环境变量读取缓存目录
+    monkeypatch.setenv('AMAZON_MONITOR_CACHE_DIR', str(cache_dir))
+    yield cache_dir
+    # 分析磁盘缓存按首次使用时的目录创建，每个测试结束后关闭，下个测试重新创建
+    if server._analysis_disk_cache.cache_info().currsize:
+        server._analysis_disk_cache().close()
+        server._analysis_disk_cache.cache_clear()
 
 
 class TestMCPServer:
     """测试 MCP 服务器功能"""
     
-    @pytest.fixture
+    @pytest.fixture(scope='module')
     def sample_products(self):
-        """样本商品数据"""
+        """样本商品数据（ProductInfo 不可变，整个模块共用一份）"""
         return [
             ProductInfo(
                 title="Gaming Laptop ASUS ROG Strix G15",
@@ -73,7 +98,7 @@ class TestMCPServer:
             )
         ]
     
-    @pytest.fixture
+    @pytest.fixture(scope='module')
     def sample_search_result(self, sample_products):
         """样本搜索结果"""
         return {
@@ -85,6 +110,11 @@ class TestMCPServer:
             'search_time': '2025-07-13T15:00:00'
         }
     
+    @pytest.fixture(scope='module')
+    def sample_search_result_json(self, sample_search_result):
+        """序列化后的样本搜索结果，只编码一次"""
+        return json.dumps(sample_search_result)
+    
     @pytest.mark.asyncio
     async def test_mcp_server_tools_available(self):
         """测试 MCP 服务器工具可用性"""
@@ -150,13 +180,13 @@ class TestMCPServer:
             print(f"✅ 找到 {len(resources)} 个资源")
     
     @pytest.mark.asyncio
-    async def test_analyze_products_tool(self, sample_search_result):
+    async def test_analyze_products_tool(self, sample_search_result_json):
         """测试商品分析工具"""
         async with Client(mcp) as client:
             # 测试分析工具
             result = await client.call_tool(
                 "analyze_products",
-                {"products_data": json.dumps(sample_search_result)}
+                {"products_data": sample_search_result_json}
             )
             
             # 验证结果
@@ -181,13 +211,13 @@ class TestMCPServer:
             print(f"✅ 商品分析功能正常，分析了 {analysis['total_products']} 个商品")
     
     @pytest.mark.asyncio
-    async def test_generate_markdown_report_tool(self, sample_search_result):
+    async def test_generate_markdown_report_tool(self, sample_search_result_json):
         """测试 Markdown 报告生成工具"""
         async with Client(mcp) as client:
             # 首先分析商品
             analysis_result = await client.call_tool(
                 "analyze_products",
-                {"products_data": json.dumps(sample_search_result)}
+                {"products_data": sample_search_result_json}
             )
             
             # 生成 Markdown 报告
@@ -356,6 +386,60 @@ class TestProductAnalyzer:
         assert result['best_rated'] is not None
         assert result['best_rated']['title'] == "Test Product"
         print(f"✅ 单个商品分析正常")
+    
+    def test_analyze_best_rated_and_best_seller(self):
+        """测试最佳评分与最佳销量商品的选择"""
+        analyzer = ProductAnalyzer()
+        
+        def make(title, rating, review_count):
+            return ProductInfo(
+                title=title, price=100.0, original_price=None, rating=rating,
+                review_count=review_count, discount_percentage=None,
+                availability="In Stock", image_url=None,
+                product_url="https://www.amazon.com/dp/B000000000",
+                sales_rank=None, category=None, asin=None
+            )
+        
+        products = [
+            make("Few Reviews", 5.0, 3),
+            make("Top Rated", 4.8, 150),
+            make("Most Reviews", 4.0, 900),
+            make("Also Most Reviews", 3.5, 900)
+        ]
+        
+        result = analyzer.analyze_products(products)
+        
+        # 评论数不足 5 的商品不参与评分排名；评论数并列时保留最先出现的商品
+        assert result['best_rated']['title'] == "Top Rated"
+        assert result['best_seller']['title'] == "Most Reviews"
+        print(f"✅ 最佳评分与最佳销量选择正常")
+    
+    def test_analyze_most_discounted(self):
+        """测试基于价格中位数的最高折扣商品估算"""
+        analyzer = ProductAnalyzer()
+        
+        def make(title, price):
+            return ProductInfo(
+                title=title, price=price, original_price=None, rating=None,
+                review_count=None, discount_percentage=None,
+                availability="In Stock", image_url=None,
+                product_url="https://www.amazon.com/dp/B000000000",
+                sales_rank=None, category=None, asin=None
+            )
+        
+        products = [make("Regular A", 100.0), make("Cheapest", 20.0), make("Regular B", 110.0),
+                    make("Cheap", 60.0)]
+        
+        result = analyzer.analyze_products(products)
+        
+        # 中位数取偏高的一个（100.0），低于其 70% 的商品才视为折扣商品
+        assert result['most_discounted']['title'] == "Cheapest"
+        assert result['most_discounted']['discount_percentage'] == pytest.approx(80.0)
+        # 分析结果使用副本，输入的商品对象保持不变
+        assert products[1].discount_percentage is None
+        with pytest.raises(AttributeError):
+            products[1].price = 10.0
+        print(f"✅ 最高折扣商品估算正常")
 
 
 def test_product_info_to_dict():
@@ -385,6 +469,796 @@ def test_product_info_to_dict():
     print(f"✅ ProductInfo 转字典正常")
 
 
+def test_add_affiliate_id_to_url():
+    """测试联盟 ID 的追加与替换"""
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B08N5WRWNW", "test-20") == \
+        "https://www.amazon.com/dp/B08N5WRWNW?tag=test-20"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?keywords=laptop", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?keywords=laptop&tag=test-20"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?tag=old-20&th=1", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?tag=test-20&th=1"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?k=usb%20hub&tag=old-20", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?k=usb%20hub&tag=test-20"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?tag=a-20&tag=b-20", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?tag=test-20"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?a=1&a=2#frag", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?a=1&a=2&tag=test-20#frag"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?tag=old-20&a=1&a=2#frag", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?a=1&a=2&tag=test-20#frag"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6#reviews", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?tag=test-20#reviews"
+    assert add_affiliate_id_to_url("https://www.amazon.com/dp/B09G9FPHY6?hashtag=deal", "test-20") == \
+        "https://www.amazon.com/dp/B09G9FPHY6?hashtag=deal&tag=test-20"
+    assert add_affiliate_id_to_url("https://example.com/?next=amazon.com", "test-20") == \
+        "https://example.com/?next=amazon.com"
+    print(f"✅ 联盟链接生成正常")
+
+
+def test_product_info_from_dict():
+    """测试从字典重建 ProductInfo 对象"""
+    product = ProductInfo.from_dict({
+        'title': 'Partial Product',
+        'price': 19.99,
+        'rating': 4.1
+    })
+    
+    assert product.title == 'Partial Product'
+    assert product.price == 19.99
+    assert product.rating == 4.1
+    assert product.review_count is None
+    assert product.availability == 'Unknown'
+    assert product.product_url == ''
+    print(f"✅ 字典重建 ProductInfo 正常")
+
+
+def test_search_results_are_cached():
+    """测试相同参数的搜索命中缓存"""
+    product = ProductInfo(
+        title="Cached Product",
+        price=19.99,
+        original_price=None,
+        rating=4.0,
+        review_count=10,
+        discount_percentage=None,
+        availability="In Stock",
+        image_url=None,
+        product_url="https://www.amazon.com/dp/B000000001",
+        sales_rank=None,
+        category=None,
+        asin="B000000001"
+    )
+    
+    server._search_cache.clear()
+    with patch.object(server._scraper(), 'search_products', return_value=[product]) as mock_search:
+        first, _ = server._search_amazon_products_internal("Cache Test", "All", 1)
+        second, _ = server._search_amazon_products_internal("cache test ", "All", 1)
+        first['products'].clear()
+        third, _ = server._search_amazon_products_internal("cache test", "All", 1)
+    server._search_cache.clear()
+    
+    assert mock_search.call_count == 1
+    # 每次命中返回独立的副本，修改一份不影响后续调用
+    assert first is not second
+    assert second['products'] and third == second
+    print(f"✅ 搜索缓存功能正常")
+
+
+SEARCH_PAGE_HTML = """<html><body>
+<div data-component-type="s-search-result">
+  <h2><a href="/Sample-Headphones/dp/B0ABCDEF12/ref=sr_1_1"><span>Sample Headphones</span></a></h2>
+  <span class="a-price-whole">1,299<span class="a-price-decimal">.</span></span>
+  <span aria-label="4.6 out of 5 stars"></span>
+  <a href="/Sample-Headphones/dp/B0ABCDEF12#customerReviews">2,345</a>
+  <img src="https://m.media-amazon.com/images/I/sample.jpg">
+</div>
+<div data-component-type="s-search-result">
+  <h2><a href="/Untitled/dp/B0ABCDEF34"></a></h2>
+</div>
+</body></html>"""
+
+
+def test_search_with_requests_parses_results():
+    """测试 requests 方式解析搜索结果页"""
+    scraper = AmazonScraper()
+    response = MagicMock(content=SEARCH_PAGE_HTML.encode('utf-8'))
+    
+    with patch.object(scraper.session, 'get', return_value=response):
+        products = scraper._search_with_requests("https://www.amazon.com/s", {'k': 'headphones', 'page': 1})
+    scraper.close()
+    
+    assert len(products) == 1
+    product = products[0]
+    assert product.title == "Sample Headphones"
+    assert product.price == 1299.0
+    assert product.rating == 4.6
+    assert product.review_count == 2345
+    assert product.asin == "B0ABCDEF12"
+    assert product.product_url == "https://www.amazon.com/Sample-Headphones/dp/B0ABCDEF12/ref=sr_1_1"
+    assert product.image_url == "https://m.media-amazon.com/images/I/sample.jpg"
+    print(f"✅ 搜索结果页解析正常")
+
+
+def test_lxml_and_bs4_parsers_agree():
+    """测试 lxml 与 BeautifulSoup 两种解析方式结果一致"""
+    scraper = AmazonScraper()
+    content = SEARCH_PAGE_HTML.encode('utf-8')
+    
+    lxml_products = scraper._parse_search_page_lxml(content)
+    bs4_products = scraper._parse_search_page_bs4(content)
+    scraper.close()
+    
+    assert lxml_products == bs4_products
+    print(f"✅ 两种解析方式结果一致")
+
+
+def test_search_with_requests_backs_off_when_throttled():
+    """测试请求被限流时暂停后续请求"""
+    scraper = AmazonScraper()
+    response = MagicMock(status_code=503, content=b'<html></html>')
+    
+    with patch.object(scraper.session, 'get', return_value=response), \
+         patch.object(scraper._rate, 'penalize') as mock_penalize:
+        products = scraper._search_with_requests("https://www.amazon.com/s", {'k': 'headphones', 'page': 1})
+    scraper.close()
+    
+    assert products == []
+    mock_penalize.assert_called_once()
+    print(f"✅ 限流退避正常")
+
+
+def test_session_does_not_retry_throttled_responses():
+    """测试 HTTP 适配器不自动重试限流响应，避免绕过令牌桶"""
+    scraper = AmazonScraper()
+    retries = scraper.session.get_adapter("https://www.amazon.com/s").max_retries
+    scraper.close()
+    
+    assert not {429, 503} & set(retries.status_forcelist)
+    assert {502, 504} <= set(retries.status_forcelist)
+    print(f"✅ 限流响应不自动重试")
+
+
+def test_search_with_requests_limits_concurrency():
+    """测试进程内同时进行中的请求数不超过 MAX_CONCURRENCY，多个抓取器共用同一上限"""
+    scraper = AmazonScraper()
+    other_scraper = AmazonScraper()
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    
+    def slow_get(url, timeout):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return MagicMock(status_code=200, content=b'<html></html>')
+    
+    scrapers = [scraper, other_scraper] * 3
+    with patch.object(scraper.session, 'get', side_effect=slow_get), \
+         patch.object(other_scraper.session, 'get', side_effect=slow_get), \
+         patch.object(scraper._rate, 'acquire'), \
+         ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(
+            lambda page: scrapers[page - 1]._search_with_requests(
+                "https://www.amazon.com/s", {'k': 'mouse', 'page': page}
+            ),
+            range(1, 7)
+        ))
+    scraper.close()
+    other_scraper.close()
+    
+    assert other_scraper._rate is scraper._rate
+    assert peak == min(6, MAX_CONCURRENCY)
+    print(f"✅ 请求并发限制正常")
+
+
+def test_env_number_validates_and_clamps():
+    """测试限速相关环境变量的校验：非法值报错，过小的值按最小值处理"""
+    with patch.dict(os.environ, {'AMAZON_MIN_INTERVAL': '0'}):
+        assert _env_number('AMAZON_MIN_INTERVAL', '1.0', float, 0.01) == 0.01
+    with patch.dict(os.environ, {'AMAZON_MAX_CONCURRENCY': '-3'}):
+        assert _env_number('AMAZON_MAX_CONCURRENCY', '2', int, 1) == 1
+    with patch.dict(os.environ, {'AMAZON_MIN_INTERVAL': 'fast'}):
+        with pytest.raises(ValueError, match='AMAZON_MIN_INTERVAL'):
+            _env_number('AMAZON_MIN_INTERVAL', '1.0', float, 0.01)
+    with patch.dict(os.environ, {'AMAZON_MIN_INTERVAL': 'inf'}):
+        with pytest.raises(ValueError, match='AMAZON_MIN_INTERVAL'):
+            _env_number('AMAZON_MIN_INTERVAL', '1.0', float, 0.01)
+    print(f"✅ 环境变量校验正常")
+
+
+def test_search_pages_are_cached_on_disk(isolated_cache_dir):
+    """测试单页搜索结果的磁盘缓存"""
+    product = ProductInfo(
+        title="Page Cached Product", price=5.0, original_price=None, rating=None,
+        review_count=None, discount_percentage=None, availability="Unknown",
+        image_url=None, product_url="https://www.amazon.com/dp/B000000004",
+        sales_rank=None, category=None, asin="B000000004"
+    )
+    fetch = MagicMock(return_value=[product])
+    
+    scraper = AmazonScraper()
+    opened_on_init = scraper._page_cache is not None
+    first = scraper._cached_page("Page Cache", "Books", 1, fetch)
+    second = scraper._cached_page("page cache", "Books", 1, fetch)
+    scraper.close()
+    
+    assert opened_on_init is False
+    assert (isolated_cache_dir / 'pages').is_dir()
+    assert fetch.call_count == 1
+    assert second == first == [product]
+    print(f"✅ 页面磁盘缓存正常")
+
+
+def test_build_search_url_encodes_keyword():
+    """测试搜索 URL 对关键词进行编码"""
+    scraper = AmazonScraper()
+    url = scraper._build_search_url("https://www.amazon.com/s", {'k': 'usb c & hdmi', 'page': 2, 'rh': 'n:172282'})
+    scraper.close()
+    
+    assert url == "https://www.amazon.com/s?k=usb+c+%26+hdmi&page=2&rh=n%3A172282"
+    print(f"✅ 搜索 URL 编码正常")
+
+
+def test_product_from_selenium_card():
+    """测试由浏览器内提取的卡片字段构建商品"""
+    scraper = AmazonScraper()
+    card = {
+        'title': ' Sample Headphones ',
+        'href': 'https://www.amazon.com/Sample-Headphones/dp/B0ABCDEF12/ref=sr_1_1',
+        'price': '1,299.',
+        'rating': '4.6 out of 5 stars',
+        'reviews': '2,345',
+        'img': 'https://m.media-amazon.com/images/I/sample.jpg'
+    }
+    
+    product = scraper._product_from_card(card)
+    missing_title = scraper._product_from_card({'title': None, 'href': None})
+    scraper.close()
+    
+    assert product.title == "Sample Headphones"
+    assert product.price == 1299.0
+    assert product.rating == 4.6
+    assert product.review_count == 2345
+    assert product.asin == "B0ABCDEF12"
+    assert missing_title is None
+    print(f"✅ Selenium 卡片解析正常")
+
+
+def test_send_reports_reuses_smtp_connection():
+    """测试批量发送邮件只建立一次 SMTP 连接"""
+    reporter = EmailReporter()
+    analysis = {'total_products': 0, 'analysis_summary': '无'}
+    reports = [
+        {'analysis_result': analysis, 'recipient_email': 'a@example.com', 'keyword': 'laptop'},
+        {'analysis_result': analysis, 'recipient_email': 'b@example.com', 'keyword': 'phone'}
+    ]
+    
+    with patch('smtplib.SMTP') as mock_smtp:
+        results = reporter.send_reports(reports, 'sender@example.com', 'password')
+    
+    server_conn = mock_smtp.return_value.__enter__.return_value
+    assert results == [True, True]
+    assert mock_smtp.call_count == 1
+    assert server_conn.login.call_count == 1
+    assert server_conn.send_message.call_count == 2
+    print(f"✅ 批量邮件发送正常")
+
+
+def test_html_report_escapes_product_fields():
+    """测试 HTML 报告对商品标题等字段进行转义"""
+    reporter = EmailReporter()
+    analysis = {
+        'total_products': 1,
+        'valid_products': 1,
+        'analysis_summary': '最佳评分商品: <Cable & Adapter>',
+        'best_rated': {
+            'title': '<Cable & Adapter>',
+            'price': 9.99,
+            'rating': 4.5,
+            'review_count': 20,
+            'product_url': 'https://www.amazon.com/dp/B000000001'
+        }
+    }
+    
+    html_report = reporter._generate_html_report(analysis, 'usb <c>')
+    
+    assert '&lt;Cable &amp; Adapter&gt;' in html_report
+    assert '<Cable' not in html_report
+    assert 'usb &lt;c&gt;' in html_report
+    assert '未找到折扣商品' in html_report
+    assert html_report.rstrip().endswith('</html>')
+    print(f"✅ HTML 报告转义正常")
+
+
+def test_get_due_monitors():
+    """测试到期监控判断"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        now = datetime.now()
+        monitor.data['monitors'] = [
+            {'id': 'never_run', 'frequency': 'daily', 'last_run': None, 'active': True},
+            {'id': 'ran_recently', 'frequency': 'daily',
+             'last_run': (now - timedelta(hours=1)).isoformat(), 'active': True},
+            {'id': 'weekly_overdue', 'frequency': 'weekly',
+             'last_run': (now - timedelta(days=8)).isoformat(), 'active': True},
+            {'id': 'inactive', 'frequency': 'daily', 'last_run': None, 'active': False}
+        ]
+        
+        due_ids = [m['id'] for m in monitor.get_due_monitors()]
+        monitor.close()
+    
+    assert due_ids == ['never_run', 'weekly_overdue']
+    print(f"✅ 到期监控判断正常")
+
+
+def test_monitor_history_jsonl():
+    """测试运行历史写入 JSONL 文件及旧版数据迁移"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = Path(tmp_dir) / "monitors.json"
+        data_file.write_text(json.dumps({
+            'monitors': [],
+            'history': [{'monitor_id': 'old_monitor', 'success': True}],
+            'settings': {}
+        }), encoding='utf-8')
+        
+        monitor = ProductMonitor(str(data_file))
+        monitor._append_history({'monitor_id': 'new_monitor', 'success': False})
+        
+        all_history = monitor.get_monitor_history()
+        new_history = monitor.get_monitor_history('new_monitor')
+        saved_data = json.loads(data_file.read_text(encoding='utf-8'))
+        history_lines = (Path(tmp_dir) / "monitors_history.jsonl").read_text(encoding='utf-8').splitlines()
+        monitor.close()
+    
+    assert [h['monitor_id'] for h in all_history] == ['old_monitor', 'new_monitor']
+    assert new_history == [{'monitor_id': 'new_monitor', 'success': False}]
+    assert 'history' not in saved_data
+    assert len(history_lines) == 2
+    print(f"✅ 运行历史 JSONL 存储正常")
+
+
+def test_json_loads_accepts_stdlib_json():
+    """测试 JSON 解析对标准库可接受的输入保持兼容"""
+    data = json_loads('{"title": "Caf\u00e9", "price": NaN}')
+    
+    assert data['title'] == "Café"
+    assert math.isnan(data['price'])
+    assert json_loads(b'[1, 2]') == [1, 2]
+    with pytest.raises(json.JSONDecodeError):
+        json_loads('{invalid')
+    print(f"✅ JSON 解析兼容性正常")
+
+
+def test_monitor_history_limit_reads_from_end():
+    """测试只读取最近的若干条运行历史"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        for i in range(5):
+            monitor._append_history({'monitor_id': 'monitor_a', 'run': i})
+            monitor._append_history({'monitor_id': 'monitor_b', 'run': i})
+        
+        recent_a = monitor.get_monitor_history('monitor_a', limit=2)
+        recent_all = monitor.get_monitor_history(limit=3)
+        # 块大小小于单行长度时仍能正确拼接跨块的行
+        reversed_lines = list(monitor._iter_history_lines_reversed(block_size=7))
+        monitor.close()
+    
+    assert [h['run'] for h in recent_a] == [3, 4]
+    assert [(h['monitor_id'], h['run']) for h in recent_all] == \
+        [('monitor_b', 3), ('monitor_a', 4), ('monitor_b', 4)]
+    assert [json.loads(line)['run'] for line in reversed_lines] == [4, 4, 3, 3, 2, 2, 1, 1, 0, 0]
+    print(f"✅ 最近运行历史读取正常")
+
+
+def test_monitor_data_saves_are_debounced():
+    """测试短时间内的多次修改合并写盘，关闭时写入剩余修改"""
+    from src.amazon_monitor import tools
+    
+    # 加大合并间隔，避免定时器在断言前触发写盘
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+         patch.object(tools, 'SAVE_DEBOUNCE_SECONDS', 3600), \
+         patch.object(tools, 'json_dumps_bytes', wraps=tools.json_dumps_bytes) as dumps, \
+         patch.object(tools.atexit, 'unregister', wraps=tools.atexit.unregister) as unregister:
+        data_file = Path(tmp_dir) / "monitors.json"
+        monitor = ProductMonitor(str(data_file))
+        first_id = monitor.add_monitor("usb hub")
+        second_id = monitor.add_monitor("hdmi cable")
+        third_id = monitor.add_monitor("ethernet cable")
+        
+        writes_before_close = dumps.call_count
+        saved_before_close = json.loads(data_file.read_text(encoding='utf-8'))
+        monitor.close()
+        writes_after_close = dumps.call_count
+        saved_after_close = json.loads(data_file.read_text(encoding='utf-8'))
+    
+    assert writes_before_close == 1
+    assert writes_after_close == 2
+    assert [m['id'] for m in saved_before_close['monitors']] == [first_id]
+    assert [m['id'] for m in saved_after_close['monitors']] == [first_id, second_id, third_id]
+    unregister.assert_called_once_with(monitor._flush)
+    print(f"✅ 监控数据延迟写盘正常")
+
+
+def test_remove_monitor():
+    """测试删除监控只移除匹配的条目"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        first_id = monitor.add_monitor("webcam")
+        second_id = monitor.add_monitor("microphone")
+        
+        removed = monitor.remove_monitor(first_id)
+        removed_again = monitor.remove_monitor(first_id)
+        remaining = [m['id'] for m in monitor.get_monitors()]
+        monitor.close()
+    
+    assert removed is True
+    assert removed_again is False
+    assert remaining == [second_id]
+    print(f"✅ 删除监控正常")
+
+
+def test_add_monitor_after_remove_gets_unique_id():
+    """测试删除监控后新增的监控不会与现有监控 ID 重复"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        first_id = monitor.add_monitor("a")
+        second_id = monitor.add_monitor("b")
+        monitor.remove_monitor(first_id)
+        third_id = monitor.add_monitor("c")
+        
+        monitor.remove_monitor(third_id)
+        remaining = [m['id'] for m in monitor.get_monitors()]
+        removed_second = monitor.remove_monitor(second_id)
+        monitor.close()
+    
+    assert third_id != second_id
+    assert remaining == [second_id]
+    assert removed_second is True
+    print(f"✅ 监控 ID 唯一")
+
+
+def test_readded_monitor_does_not_inherit_history():
+    """测试删除后重新添加的监控不复用旧 ID，也不会继承已删除监控的运行历史"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, "monitors.json")
+        monitor = ProductMonitor(data_file)
+        old_id = monitor.add_monitor("keyboard")
+        monitor._append_history({'monitor_id': old_id, 'success': True})
+        monitor.remove_monitor(old_id)
+        new_id = monitor.add_monitor("keyboard")
+        new_history = monitor.get_monitor_history(new_id)
+        monitor.remove_monitor(new_id)
+        monitor.close()
+        
+        # 计数器随数据文件保存，重新加载后同样不会复用旧 ID
+        reloaded = ProductMonitor(data_file)
+        reloaded_id = reloaded.add_monitor("keyboard")
+        reloaded_history = reloaded.get_monitor_history(reloaded_id)
+        reloaded.close()
+    
+    assert len({old_id, new_id, reloaded_id}) == 3
+    assert new_history == []
+    assert reloaded_history == []
+    print(f"✅ 重新添加的监控历史为空")
+
+
+def test_monitor_summaries_are_cached_until_modified():
+    """测试监控摘要只含摘要字段，返回副本，并在监控数据修改后重建"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        first_id = monitor.add_monitor("ssd", email="notify@example.com")
+        
+        first = monitor.get_monitor_summaries()
+        first[0]['keyword'] = "mutated by caller"
+        again = monitor.get_monitor_summaries()
+        second_id = monitor.add_monitor("nvme enclosure")
+        updated = monitor.get_monitor_summaries()
+        monitor.close()
+    
+    assert set(first[0]) == {'id', 'keyword', 'category', 'frequency', 'active', 'last_run'}
+    assert again == [{'id': first_id, 'keyword': "ssd", 'category': "All", 'frequency': "daily",
+                      'active': True, 'last_run': None}]
+    assert [m['id'] for m in updated] == [first_id, second_id]
+    print(f"✅ 监控摘要缓存正常")
+
+
+def test_run_monitor_records_history():
+    """测试运行监控后记录历史并更新上次运行时间"""
+    product = ProductInfo(
+        title="Monitor Product", price=25.0, original_price=None, rating=4.4,
+        review_count=120, discount_percentage=None, availability="In Stock",
+        image_url=None, product_url="https://www.amazon.com/dp/B000000003",
+        sales_rank=None, category=None, asin="B000000003"
+    )
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        monitor_id = monitor.add_monitor("desk lamp")
+        
+        with patch.object(monitor.scraper, 'search_products', return_value=[product]):
+            result = monitor.run_monitor(monitor_id)
+        with patch.object(monitor.scraper, 'search_products', side_effect=RuntimeError("blocked")):
+            failed = monitor.run_monitor(monitor_id)
+        missing = monitor.run_monitor("monitor_missing")
+        monitor._by_id[monitor_id]['active'] = False
+        disabled = monitor.run_monitor(monitor_id)
+        
+        history = monitor.get_monitor_history(monitor_id)
+        last_run = monitor.get_monitors()[0]['last_run']
+        monitor.close()
+    
+    assert result['success'] and result['products_found'] == 1
+    assert failed == {'success': False, 'monitor_id': monitor_id, 'error': 'blocked'}
+    assert missing == {'success': False, 'monitor_id': "monitor_missing", 'error': '监控不存在'}
+    assert disabled == {'success': False, 'monitor_id': monitor_id, 'error': '监控已禁用'}
+    assert [h['success'] for h in history] == [True, False]
+    assert last_run is not None
+    print(f"✅ 监控运行记录正常")
+
+
+def test_run_all_active_aggregates_results():
+    """测试多进程运行所有启用的监控：使用 spawn 启动子进程，成功与失败结果均被记录"""
+    executor_kwargs = {}
+    
+    def fake_process_pool(**kwargs):
+        # 在线程中执行任务，避免测试中真正启动子进程
+        executor_kwargs.update(kwargs)
+        return ThreadPoolExecutor(max_workers=kwargs['max_workers'])
+    
+    def fake_worker(monitor, sender_email, sender_password):
+        if monitor['keyword'] == "broken":
+            raise RuntimeError("worker crashed")
+        return {'success': True, 'monitor_id': monitor['id']}, {
+            'monitor_id': monitor['id'], 'success': True
+        }
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        ok_id = monitor.add_monitor("working")
+        broken_id = monitor.add_monitor("broken")
+        
+        with patch('src.amazon_monitor.tools.ProcessPoolExecutor', side_effect=fake_process_pool), \
+             patch('src.amazon_monitor.tools._run_monitor_worker', side_effect=fake_worker):
+            results = monitor.run_all_active(max_workers=8)
+        
+        history = monitor.get_monitor_history()
+        last_runs = {m['id']: m['last_run'] for m in monitor.get_monitors()}
+        monitor.close()
+    
+    assert executor_kwargs['mp_context'].get_start_method() == 'spawn'
+    assert executor_kwargs['max_workers'] == min(2, MAX_CONCURRENCY)
+    assert executor_kwargs['initargs'] == (executor_kwargs['max_workers'],)
+    assert results[0] == {'success': True, 'monitor_id': ok_id}
+    assert results[1] == {'success': False, 'monitor_id': broken_id, 'error': "worker crashed"}
+    assert [(h['monitor_id'], h['success']) for h in history] == [(ok_id, True), (broken_id, False)]
+    assert last_runs[ok_id] is not None and last_runs[broken_id] is None
+    print(f"✅ 多进程运行监控结果汇总正常")
+
+
+@pytest.mark.asyncio
+async def test_run_all_due_monitors():
+    """测试并发运行到期监控，未到期的监控被跳过"""
+    product = ProductInfo(
+        title="Due Product", price=15.0, original_price=None, rating=4.1,
+        review_count=30, discount_percentage=None, availability="In Stock",
+        image_url=None, product_url="https://www.amazon.com/dp/B000000005",
+        sales_rank=None, category=None, asin="B000000005"
+    )
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        due_id = monitor.add_monitor("keyboard")
+        failing_id = monitor.add_monitor("trackpad")
+        recent_id = monitor.add_monitor("monitor arm")
+        monitor._by_id[recent_id]['last_run'] = datetime.now().isoformat()
+        
+        def search(keyword, category):
+            if keyword == "trackpad":
+                raise RuntimeError("blocked")
+            return [product]
+        
+        with patch.object(server, '_monitor', return_value=monitor), \
+             patch.object(monitor.scraper, 'search_products', side_effect=search) as mock_search:
+            result = await server.run_all_due_monitors.fn(max_concurrent=2)
+        monitor.close()
+    
+    assert result['success']
+    assert result['total_monitors'] == 2
+    assert result['succeeded'] == 1
+    assert sorted(r['monitor_id'] for r in result['results']) == sorted([due_id, failing_id])
+    assert mock_search.call_count == 2
+    print(f"✅ 到期监控批量运行正常")
+
+
+@pytest.mark.asyncio
+async def test_analyze_products_is_memoized():
+    """测试相同的商品数据字符串只分析一次"""
+    products_data = json.dumps({
+        'products': [
+            {'title': 'Memo Product', 'price': 12.0, 'rating': 4.0, 'review_count': 40}
+        ]
+    })
+    server._analysis_result_cache.clear()
+    analyzer = server._analyzer()
+    
+    with patch.object(analyzer, 'analyze_products', wraps=analyzer.analyze_products) as mock_analyze:
+        first = await server.analyze_products.fn(products_data)
+        second = await server.analyze_products.fn(products_data)
+        second['best_rated'] = None
+        third = await server.analyze_products.fn(products_data)
+    server._analysis_result_cache.clear()
+    
+    assert first is not second
+    assert third == first
+    assert first['total_products'] == 1
+    mock_analyze.assert_called_once()
+    print(f"✅ 分析结果缓存正常")
+
+
+@pytest.mark.asyncio
+async def test_history_tools_run_off_event_loop():
+    """测试读取历史的工具和资源为异步实现，文件读取在线程中执行"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        monitor._append_history({'monitor_id': 'monitor_x', 'success': True})
+        
+        with patch.object(server, '_monitor', return_value=monitor), \
+             patch.object(server.asyncio, 'to_thread', wraps=asyncio.to_thread) as mock_to_thread:
+            history = await server.get_monitor_history.fn('monitor_x')
+            data = json.loads(await server.monitor_data_resource.fn())
+            ndjson = await server.monitor_history_ndjson_resource.fn()
+        monitor.close()
+    
+    assert history['total_records'] == 1
+    assert data['history'] == [{'monitor_id': 'monitor_x', 'success': True}]
+    assert json.loads(ndjson) == {'monitor_id': 'monitor_x', 'success': True}
+    assert mock_to_thread.call_count == 3
+    print(f"✅ 历史读取不阻塞事件循环")
+
+
+@pytest.mark.asyncio
+async def test_monitor_tools_build_monitor_off_event_loop():
+    """测试监控工具在线程中获取 ProductMonitor，首次创建时不阻塞事件循环"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        calling_threads = []
+        
+        def monitor_factory():
+            calling_threads.append(threading.current_thread())
+            return monitor
+        
+        with patch.object(server, '_monitor', side_effect=monitor_factory):
+            created = await server.create_product_monitor.fn("usb microphone")
+            listed = await server.list_product_monitors.fn()
+            detailed = await server.list_product_monitors.fn(detailed=True)
+            with patch.object(monitor, 'run_monitor', return_value={'success': True}):
+                due = await server.run_all_due_monitors.fn()
+            removed = await server.remove_product_monitor.fn(created['monitor_id'])
+        monitor.close()
+    
+    assert listed['total_monitors'] == 1 and detailed['total_monitors'] == 1
+    assert due['total_monitors'] == 1
+    assert removed['success'] is True
+    assert calling_threads and threading.main_thread() not in calling_threads
+    print(f"✅ 监控工具不阻塞事件循环")
+
+
+@pytest.mark.asyncio
+async def test_clear_search_cache_clears_persisted_caches():
+    """测试清空缓存时会清理上次运行遗留的磁盘缓存，且不会为此创建抓取器"""
+    scraper_factory = MagicMock()
+    scraper_factory.cache_info.return_value.currsize = 0
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = Path(tmp_dir)
+        # 模拟进程重启前写入的缓存
+        with Cache(str(cache_dir / 'pages')) as stale_pages:
+            stale_pages.set('page', ['stale'])
+        analysis_store = Cache(str(cache_dir / 'analysis'))
+        analysis_store.set('first', {'stale': True})
+        analysis_store.set('second', {'stale': True})
+        
+        with patch.object(server, 'CACHE_DIR', cache_dir), \
+             patch.object(server, '_scraper', scraper_factory), \
+             patch.object(server, '_analysis_disk_cache', return_value=analysis_store):
+            result = await server.clear_search_cache.fn()
+        
+        remaining_analysis = len(analysis_store)
+        analysis_store.close()
+        with Cache(str(cache_dir / 'pages')) as pages:
+            remaining_pages = len(pages)
+    
+    scraper_factory.assert_not_called()
+    assert result['cleared_page_entries'] == 1
+    assert result['cleared_analysis_entries'] == 2
+    assert remaining_analysis == 0 and remaining_pages == 0
+    print(f"✅ 清空缓存清理磁盘缓存")
+
+
+@pytest.mark.asyncio
+async def test_batch_execute():
+    """测试批量执行工具调用"""
+    products_data = json.dumps({
+        'products': [
+            {'title': 'Batch Product', 'price': 10.0, 'rating': 4.2, 'review_count': 50}
+        ]
+    })
+    
+    result = await server.batch_execute.fn([
+        {'name': 'analyze_products', 'args': {'products_data': products_data}},
+        {'name': 'nonexistent_tool', 'args': {}}
+    ])
+    
+    assert result['total_calls'] == 2
+    assert not result['success']
+    assert result['results'][0]['success']
+    assert result['results'][0]['result']['total_products'] == 1
+    assert not result['results'][1]['success']
+    print(f"✅ 批量执行功能正常")
+
+
+@pytest.mark.asyncio
+async def test_batch_execute_validates_arguments():
+    """测试批量执行与单独调用工具一样校验并转换参数，非法参数返回校验错误"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        monitor = ProductMonitor(os.path.join(tmp_dir, "monitors.json"))
+        monitor.add_monitor("usb hub", email="notify@example.com")
+        
+        with patch.object(server, '_monitor', return_value=monitor):
+            result = await server.batch_execute.fn([
+                {'name': 'get_monitor_history', 'args': {'limit': 'not a number'}},
+                {'name': 'list_product_monitors', 'args': {'detailed': 'true'}},
+                {'name': 'list_product_monitors', 'args': {'verbose': True}},
+                {'name': 'remove_product_monitor', 'args': {}}
+            ])
+        monitor.close()
+    
+    invalid_limit, coerced, unexpected, missing = result['results']
+    assert invalid_limit['success'] is False and 'limit' in invalid_limit['error']
+    assert coerced['success'] is True
+    assert coerced['result']['monitors'][0]['email'] == "notify@example.com"
+    assert unexpected['success'] is False and 'verbose' in unexpected['error']
+    assert missing['success'] is False and 'monitor_id' in missing['error']
+    print(f"✅ 批量执行参数校验正常")
+
+
+@pytest.mark.asyncio
+async def test_batch_execute_stop_on_error_cancels_pending_calls():
+    """测试 stop_on_error 时出错后取消其余调用并保留已完成的结果"""
+    finished = []
+    
+    async def quick():
+        return 'done'
+    
+    async def slow():
+        await asyncio.sleep(5)
+        finished.append('slow')
+        return 'late'
+    
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+    
+    with patch.dict(server._TOOLS, {'quick': quick, 'slow': slow, 'failing': failing}):
+        result = await server.batch_execute.fn([
+            {'name': 'quick'},
+            {'name': 'slow'},
+            {'name': 'failing'}
+        ], stop_on_error=True)
+    
+    assert not result['success']
+    assert result['failed_index'] == 2
+    assert result['error'] == 'boom'
+    assert result['results'][0] == {'name': 'quick', 'success': True, 'result': 'done'}
+    assert result['results'][1]['cancelled']
+    assert result['results'][2]['error'] == 'boom'
+    assert finished == []
+    print(f"✅ 批量执行出错时取消其余调用")
+
+
 @pytest.mark.asyncio
 async def test_mcp_server_complete_workflow():
     """测试 MCP 服务器完整工作流程"""